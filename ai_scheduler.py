@@ -0,0 +1,61 @@
+import math
+
+
+class AIScheduler:
+    """
+    Spreads the think steps of enemies, their pathfinding, steering and attack checks, across frames.
+
+    Every enemy thinks at an interval set by its distance to the player, and enemies that are far away or have no path
+    think less often. Each frame at most THINK_BUDGET enemies whose interval has passed are allowed to think, the most
+    overdue first, so a crowd of enemies costs a bounded amount of AI work per frame. Enemies still move and animate
+    every frame with the heading of their last think step.
+    """
+    THINK_BUDGET = 12  # maximum number of think steps per frame
+    THINK_INTERVALS = [(5, 1), (10, 4)]  # frames between think steps for enemies within a distance in tiles
+    FAR_INTERVAL = 10  # frames between think steps for far or idle enemies
+
+    def __init__(self, game_state):
+        self.game_state = game_state
+        self.frame = 0
+        # frame of the last think step of every enemy
+        self.last_think = {}
+        # enemies that think during the current frame
+        self.thinking_enemies = set()
+
+    def schedule(self):
+        """Picks the enemies that think during this frame, called once every tick before the sprites are updated."""
+        self.frame += 1
+        due = []
+        for enemy in self.game_state.enemies:
+            last_think = self.last_think.get(enemy)
+            # how many intervals have passed since the last think step, enemies that never thought go first
+            priority = math.inf if last_think is None else (self.frame - last_think) / self.interval(enemy)
+            if priority >= 1:
+                due.append((priority, enemy))
+        due.sort(key=lambda entry: entry[0], reverse=True)
+        self.thinking_enemies = set(enemy for _, enemy in due[:AIScheduler.THINK_BUDGET])
+        self.last_think = {enemy: last_think for enemy, last_think in self.last_think.items() if enemy.alive()}
+        for enemy in self.thinking_enemies:
+            self.last_think[enemy] = self.frame
+
+    def interval(self, enemy):
+        """Returns the number of frames between the think steps of an enemy."""
+        player = self.game_state.player
+        if player is None:
+            return AIScheduler.FAR_INTERVAL
+        dist_squared = (player.pos - enemy.pos).magnitude_squared()
+        tile_size = self.game_state.tile_size
+        near_dist, near_interval = AIScheduler.THINK_INTERVALS[0]
+        if dist_squared < (near_dist * tile_size) ** 2:
+            return near_interval
+        # idle enemies without a path think as rarely as far ones
+        if not getattr(enemy, "pathing_nodes", None):
+            return AIScheduler.FAR_INTERVAL
+        for dist, interval in AIScheduler.THINK_INTERVALS[1:]:
+            if dist_squared < (dist * tile_size) ** 2:
+                return interval
+        return AIScheduler.FAR_INTERVAL
+
+    def thinking(self, enemy):
+        """Checks if an enemy thinks during this frame."""
+        return enemy in self.thinking_enemies
@@ -0,0 +1,379 @@
+import pygame as pg
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import mmap
+import os
+import struct
+import warnings
+import startup_profile
+
+
+# angular resolution in degrees that cached rotations are rounded to
+ROTATION_RESOLUTION = 3
+# maximum number of rotated surfaces kept, least recently used ones are dropped first
+ROTATION_CACHE_SIZE = 1024
+# step that tint alphas are rounded to
+TINT_ALPHA_RESOLUTION = 8
+# maximum number of tinted surfaces kept, least recently used ones are dropped first
+TINT_CACHE_SIZE = 512
+# maximum number of surface masks kept, least recently used ones are dropped first
+MASK_CACHE_SIZE = 2048
+# directory searched for bundled font files before falling back to system fonts
+FONT_DIR = "assets/font"
+# prebuilt pack of scaled raw images, created by build_asset_pack.py
+PACK_PATH = "assets/assets.pack"
+# pack header: magic bytes followed by the offset and length of the index
+PACK_MAGIC = b"PUZPACK2"
+PACK_HEADER = struct.Struct("<8sQQ")
+
+
+def _numbered(path_format, names):
+    return tuple(path_format.format(x) for x in names)
+
+
+def _window_multiple(factor):
+    """Size of an image stretched to a multiple of the window size, resolved once the window size is known."""
+    return lambda window_size: (window_size[0] * factor, window_size[1] * factor)
+
+
+# every image the game loads as (paths, scale, size), grouped by the game state that first needs it, where size may be
+# a function of the window size. Images loaded without being listed here are reported with a warning
+ASSET_GROUPS = {
+    "start_menu": [
+        # start menu background, three windows wide and high
+        (("assets/map/start_menu_map_0.png",), 1, _window_multiple(3)),
+        (("assets/gui/menu/start_menu/start_menu_base.png",), 1, None),
+        (_numbered("assets/gui/button/play/play_{0}.png", ["0", "1"]), 1, None),
+        (_numbered("assets/gui/button/quit/quit_{0}.png", ["0", "1"]), 1, None),
+        (_numbered("assets/enemy/fire_mage/fire_mage_{0}.png", range(8)), 4, None),
+        (_numbered("assets/enemy/root_mage/root_mage_{0}.png", range(8)), 4, None),
+        (_numbered("assets/enemy/hook_mage/hook_mage_{0}.png", range(8)), 4, None),
+    ],
+    "playing": [
+        (("assets/map/playing_state_map_0.png",), 4, None),
+        (_numbered("assets/player/player_{0}.png", range(19)), 4, None),
+        (_numbered("assets/gui/ability_icon/{0}.png", ["melee", "shoot_fireball", "shoot_root", "shoot_hook"]), 1,
+         None),
+        (_numbered("assets/ability/fireball/fireball_{0}.png", range(4)), 1, (64, 64)),
+        (_numbered("assets/ability/Root/{0}.png", range(1, 31)), 1, (100, 100)),
+        (("assets/ability/hook/weapon_axe.png",), 1, (36, 84)),
+        (_numbered("assets/map_ornament/fountain/red_fountain/red_fountain_{0}.png", range(3)), 4, None),
+        (_numbered("assets/map_ornament/fountain/blue_fountain/blue_fountain_{0}.png", range(3)), 4, None),
+        (("assets/map_ornament/movable/movable.png",), 1, (64, 64)),
+        (_numbered("assets/map_ornament/door/door_{0}.png", range(2)), 1, (256, 192)),
+        (_numbered("assets/map_ornament/lever/lever_{0}.png", range(2)), 1, (64, 64)),
+        (_numbered("assets/map_ornament/spike/spike_{0}.png", range(4)), 1, (64, 64)),
+    ],
+    "level_1": [
+        (("assets/map/playing_state_map_1.png",), 4, None),
+    ],
+    "menus": [
+        (("assets/gui/menu/pause_menu/pause_menu_base.png",), 1, None),
+        (("assets/gui/menu/game_win_menu/game_win_menu.png",), 1, None),
+        (("assets/gui/menu/game_over_menu/game_over_menu.png",), 1, (720, 384)),
+        (_numbered("assets/gui/button/resume_game/resume_game_{0}.png", ["0", "1"]), 1, None),
+        (_numbered("assets/gui/button/quit_to_menu/quit_to_menu_{0}.png", ["0", "1"]), 1, None),
+    ],
+}
+
+
+# scaled images converted to the display format, shared by every entity, keyed by (path, scale, size)
+_image_cache = {}
+# animation frame tuples shared by every entity, keyed by (paths, scale, size)
+_frames_cache = {}
+# horizontally mirrored frame tuples, keyed by the frame tuple they mirror
+_mirrored_cache = {}
+# rotated surfaces in least recently used order, keyed by (frame, rounded angle)
+_rotation_cache = OrderedDict()
+# tinted surfaces in least recently used order, keyed by (frame, color, rounded alpha)
+_tint_cache = OrderedDict()
+# masks of opaque pixels in least recently used order, keyed by the surface they were built from
+_mask_cache = OrderedDict()
+# pixel format of the display surface that cached images are converted to, None before the display is set
+_display_format = None
+# size of the display surface, None before the display is set
+_display_size = None
+# memory-mapped asset pack, None if no pack is open
+_pack_data = None
+# packed images as (offset, width, height, pixel format, colorkey), keyed by (path, scale, size)
+_pack_index = {}
+# font objects keyed by (name, size)
+_font_cache = {}
+# rendered text surfaces keyed by (text, size, color, font name)
+_text_cache = {}
+# thread pool that decodes and scales preloaded images, created on the first preload
+_loader = None
+# futures of images being read on the loader threads, keyed by (path, scale, size)
+_pending_loads = {}
+
+
+def set_display_mode(size, flags=0):
+    """
+    Sets the display mode and converts all cached images to the pixel format of the new display.
+
+    Returns the display surface.
+    """
+    global _display_format, _display_size
+    screen = pg.display.set_mode(size, flags)
+    _display_size = screen.get_size()
+    display_format = (screen.get_bitsize(), screen.get_masks())
+    if display_format != _display_format:
+        _display_format = display_format
+        # cached images were converted for the previous display, so they are read from the pack or disk again
+        for key in _image_cache:
+            _image_cache[key] = convert(_read_image(key))
+        for paths, scale, size in _frames_cache:
+            _frames_cache[(paths, scale, size)] = tuple(_image_cache[(path, scale, size)] for path in paths)
+        # surfaces derived from the old images are dropped and made again from the new ones when next needed
+        _mirrored_cache.clear()
+        _rotation_cache.clear()
+        _tint_cache.clear()
+        _mask_cache.clear()
+    return screen
+
+
+def convert(image):
+    """Converts an image to the pixel format of the display so that it is not converted on every blit."""
+    if _display_format is None:
+        return image
+    if image.get_flags() & pg.SRCALPHA:
+        return image.convert_alpha()
+    return image.convert()
+
+
+def load_image(path, scale=1, size=None):
+    """
+    Loads an image once and returns the same scaled surface on every later call.
+
+    Images found in the open asset pack are created from its raw pixels, others are decoded from disk.
+
+    Arguments
+    path: path of the image file
+    scale: integer factor the image is scaled by, ignored if size is given
+    size: exact (width, height) the image is scaled to
+    """
+    key = (path, scale, size)
+    image = _image_cache.get(key)
+    if image is None:
+        with startup_profile.timed("asset", path):
+            pending = _pending_loads.pop(key, None)
+            if pending is None and key not in group_keys(_display_size):
+                warnings.warn(f"{key} is not listed in asset_manager.ASSET_GROUPS, so it is neither preloaded nor "
+                              f"packed")
+            # waits only for this image if it is still being read on a loader thread
+            image = pending.result() if pending is not None else _read_image(key)
+            image = convert(image)
+            _image_cache[key] = image
+    return image
+
+
+def preload(group):
+    """
+    Starts reading every image of an asset group on loader threads, so independent images decode and scale
+    concurrently. Conversion to the display format still happens on the main thread when an image is first loaded.
+    """
+    global _loader
+    if _loader is None:
+        _loader = ThreadPoolExecutor(thread_name_prefix="asset_loader")
+    for key in group_keys(_display_size, [group]):
+        if key not in _image_cache and key not in _pending_loads:
+            _pending_loads[key] = _loader.submit(_read_image, key)
+
+
+def group_keys(window_size, groups=None):
+    """
+    Returns the (path, scale, size) of every image in the given asset groups, or in all of them, without duplicates
+    and in a stable order. Sizes that depend on the window are resolved for window_size.
+    """
+    keys = {}
+    for group in ASSET_GROUPS if groups is None else groups:
+        for paths, scale, size in ASSET_GROUPS[group]:
+            if callable(size):
+                size = size(window_size)
+            for path in paths:
+                keys[(path, scale, size)] = None
+    return list(keys)
+
+
+def _read_image(key):
+    """Reads a scaled image from the asset pack if it is packed, otherwise decodes and scales it from disk."""
+    path, scale, size = key
+    with startup_profile.timed("asset_read", path):
+        packed = _pack_index.get(key)
+        if packed is not None:
+            offset, width, height, pixel_format, colorkey = packed
+            image = pg.image.frombuffer(_pack_data[offset:offset + width * height * len(pixel_format)],
+                                        (width, height), pixel_format)
+            if colorkey is not None:
+                image.set_colorkey(colorkey)
+            return image
+        return scale_image(pg.image.load(path), scale, size)
+
+
+def scale_image(image, scale=1, size=None):
+    """Scales an image by an integer factor, or to an exact size if one is given."""
+    if size is not None:
+        return pg.transform.scale(image, size)
+    elif scale != 1:
+        return pg.transform.scale(image, (image.get_width() * scale, image.get_height() * scale))
+    return image
+
+
+def open_pack(path=PACK_PATH):
+    """
+    Memory-maps a prebuilt asset pack so that packed images are not decoded or scaled at load time.
+
+    Images whose source file changed since the pack was built are skipped and loaded from disk instead.
+    Returns whether a pack was opened.
+    """
+    global _pack_data
+    index = read_pack_index(path)
+    if index is None:
+        return False
+    with open(path, "rb") as pack_file:
+        _pack_data = memoryview(mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ))
+    stale = {source for source, stamp in index["sources"].items() if source_stamp(source) != stamp}
+    for image_path, scale, size, offset, width, height, pixel_format, colorkey in index["images"]:
+        if image_path not in stale:
+            _pack_index[(image_path, scale, None if size is None else tuple(size))] = (
+                offset, width, height, pixel_format, None if colorkey is None else tuple(colorkey))
+    return True
+
+
+def read_pack_index(path=PACK_PATH):
+    """Returns the index of the asset pack at path, or None if there is no readable pack."""
+    try:
+        with open(path, "rb") as pack_file:
+            magic, index_offset, index_length = PACK_HEADER.unpack(pack_file.read(PACK_HEADER.size))
+            if magic != PACK_MAGIC:
+                return None
+            pack_file.seek(index_offset)
+            return json.loads(pack_file.read(index_length))
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def source_stamp(path):
+    """Size and modification time of a source image, used to tell if it changed after it was packed."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_frames(paths, scale=1, size=None):
+    """
+    Loads a set of animation frames as a tuple that is shared between all instances.
+
+    Frames are never modified in place - entities copy a frame before drawing over it.
+    """
+    key = (tuple(paths), scale, size)
+    frames = _frames_cache.get(key)
+    if frames is None:
+        frames = tuple(load_image(path, scale, size) for path in paths)
+        _frames_cache[key] = frames
+    return frames
+
+
+def mirror_frames(frames):
+    """Returns the left-facing version of a frame tuple, flipped once and shared by all instances."""
+    mirrored = _mirrored_cache.get(frames)
+    if mirrored is None:
+        mirrored = tuple(pg.transform.flip(frame, True, False) for frame in frames)
+        _mirrored_cache[frames] = mirrored
+    return mirrored
+
+
+def rotate(image, angle):
+    """
+    Returns image rotated counterclockwise by angle degrees.
+
+    The angle is rounded to ROTATION_RESOLUTION, and rotated surfaces are cached so that projectiles flying in the
+    same direction share one surface.
+    """
+    angle = round(angle / ROTATION_RESOLUTION) * ROTATION_RESOLUTION % 360
+    key = (image, angle)
+    rotated = _rotation_cache.get(key)
+    if rotated is None:
+        rotated = pg.transform.rotate(image, angle)
+        _rotation_cache[key] = rotated
+        if len(_rotation_cache) > ROTATION_CACHE_SIZE:
+            _rotation_cache.popitem(last=False)
+    else:
+        _rotation_cache.move_to_end(key)
+    return rotated
+
+
+def tint(image, color, alpha):
+    """
+    Returns a copy of image with a translucent color drawn over its opaque pixels, used for damage and status flashes.
+
+    The alpha is rounded to TINT_ALPHA_RESOLUTION, and tinted surfaces are cached so that affected entities cost the
+    same to draw as unaffected ones.
+    """
+    alpha = round(alpha / TINT_ALPHA_RESOLUTION) * TINT_ALPHA_RESOLUTION
+    key = (image, color, alpha)
+    tinted = _tint_cache.get(key)
+    if tinted is None:
+        tint_mask = get_mask(image).to_surface(setcolor=color)
+        tint_mask.set_colorkey((0, 0, 0))
+        tint_mask.set_alpha(alpha)
+        tinted = image.copy()
+        tinted.blit(tint_mask, (0, 0))
+        _tint_cache[key] = tinted
+        if len(_tint_cache) > TINT_CACHE_SIZE:
+            _tint_cache.popitem(last=False)
+    else:
+        _tint_cache.move_to_end(key)
+    return tinted
+
+
+def get_mask(image):
+    """
+    Returns the mask of the opaque pixels of image.
+
+    Masks are cached per surface, so every animation frame and cached rotation is only scanned once no matter how many
+    entities use it.
+    """
+    mask = _mask_cache.get(image)
+    if mask is None:
+        mask = pg.mask.from_surface(image)
+        _mask_cache[image] = mask
+        if len(_mask_cache) > MASK_CACHE_SIZE:
+            _mask_cache.popitem(last=False)
+    else:
+        _mask_cache.move_to_end(image)
+    return mask
+
+
+def load_font(name, size):
+    """
+    Returns a font of the given name and size, created once and shared by all text widgets.
+
+    A bundled font file in FONT_DIR is preferred, so that the system font database is only scanned for fonts that
+    are not bundled with the game.
+    """
+    key = (name, size)
+    font = _font_cache.get(key)
+    if font is None:
+        for extension in ["ttf", "otf"]:
+            path = os.path.join(FONT_DIR, f"{name}.{extension}")
+            if os.path.isfile(path):
+                font = pg.font.Font(path, size)
+                break
+        else:
+            font = pg.font.SysFont(name, size)
+        _font_cache[key] = font
+    return font
+
+
+def render_text(text, size, color, font_name):
+    """Returns the rendered surface of a text, rendered once for every (text, size, color, font name)."""
+    key = (text, size, color, font_name)
+    text_image = _text_cache.get(key)
+    if text_image is None:
+        text_image = load_font(font_name, size).render(text, False, color)
+        _text_cache[key] = text_image
+    return text_image
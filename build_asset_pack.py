@@ -0,0 +1,69 @@
+"""
+Packs every image in asset_manager.ASSET_GROUPS, already scaled to its in-game size, into a single file of raw pixel
+data that the game memory-maps at startup.
+
+Run with `python build_asset_pack.py` before shipping. The pack is only rebuilt if a source image changed since it was
+built or the list of packed images changed; pass --force to rebuild it regardless.
+"""
+import json
+import os
+import sys
+import pygame as pg
+import asset_manager
+
+
+# window size that images sized relative to the window are packed for, the one main.py opens
+WINDOW_SIZE = (1088, 704)
+
+
+def packed_images():
+    """Returns every (path, scale, size) the game loads, without duplicates and in a stable order."""
+    return asset_manager.group_keys(WINDOW_SIZE)
+
+
+def pack_is_current(path, images):
+    """Checks that the pack at path holds exactly these images and that none of their sources changed since."""
+    index = asset_manager.read_pack_index(path)
+    if index is None:
+        return False
+    packed = [(image[0], image[1], None if image[2] is None else tuple(image[2])) for image in index["images"]]
+    if sorted(packed, key=repr) != sorted(images, key=repr):
+        return False
+    for source, stamp in index["sources"].items():
+        if asset_manager.source_stamp(source) != stamp:
+            return False
+    return True
+
+
+def build_pack(path, images):
+    """Writes the header, the raw pixels of every image and finally the index to the pack file."""
+    index = {"sources": {}, "images": []}
+    # the pack is written next to the old one and swapped in at the end, so a failed build never leaves a broken pack
+    with open(path + ".tmp", "wb") as pack_file:
+        # header is written again once the index position is known
+        pack_file.write(asset_manager.PACK_HEADER.pack(asset_manager.PACK_MAGIC, 0, 0))
+        for image_path, scale, size in images:
+            image = asset_manager.scale_image(pg.image.load(image_path), scale, size)
+            pixel_format = "RGBA" if image.get_flags() & pg.SRCALPHA else "RGB"
+            # palette images with a transparent color keep it as a colorkey, which the raw pixels do not carry
+            colorkey = image.get_colorkey()
+            offset = pack_file.tell()
+            pack_file.write(pg.image.tobytes(image, pixel_format))
+            index["sources"][image_path] = asset_manager.source_stamp(image_path)
+            index["images"].append([image_path, scale, size, offset, image.get_width(), image.get_height(),
+                                    pixel_format, None if colorkey is None else list(colorkey)])
+        index_data = json.dumps(index).encode()
+        index_offset = pack_file.tell()
+        pack_file.write(index_data)
+        pack_file.seek(0)
+        pack_file.write(asset_manager.PACK_HEADER.pack(asset_manager.PACK_MAGIC, index_offset, len(index_data)))
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    images = packed_images()
+    if "--force" not in sys.argv and pack_is_current(asset_manager.PACK_PATH, images):
+        print(f"{asset_manager.PACK_PATH} is up to date")
+    else:
+        build_pack(asset_manager.PACK_PATH, images)
+        print(f"packed {len(images)} images into {asset_manager.PACK_PATH}")
@@ -1,10 +1,12 @@
 import pygame as pg
 from pygame.math import *
-from entity.game_entity import Entity
 from entity.game_entity import DamageSource
+from entity.game_entity import CollisionLayer
 import random
 import math
 from entity.particle import *
+import asset_manager
+from spatial_hash import sector_angle
 
 
 class MeleeAttack(DamageSource):
@@ -12,49 +14,23 @@ class MeleeAttack(DamageSource):
     DAMAGE_FLASH_TIME = 4  # time duration of white flash when damaged
     DAMAGE_FLASH_COLOR = (255, 255, 255)
 
-    @staticmethod
-    def sector_collide(attack, entity):
-        """
-        Collision logic for this attack's sector and an entity.
-
-        Note: the center of the entity must be in the sector for collision to be detected.
-        """
-        assert isinstance(attack, MeleeAttack), "sector_collide can only be used with melee attacks"
-        rel = entity.pos - attack.pos
-        # finds angle relative to horizontal of enemy
-        if rel.x == 0:
-            angle = math.pi / 2 if rel.y > 0 else -math.pi / 2
-        else:
-            angle = math.atan(rel.y / rel.x) if rel.x > 0 else math.atan(rel.y / rel.x) + math.pi
-        # checks if entity angle is within allowed range
-        if attack.angle_min < angle < attack.angle_max:
-            # checks entity is within distance
-            if rel.magnitude_squared() < attack.range_squared:
-                return True
-
-        return False
-
-    def __init__(self, group, game_state, pos, damage, range, dir, spread, duration, kill_list, damage_list):
-        super().__init__(group, game_state, pos, damage, duration, kill_list, damage_list, [pg.Surface((1, 1))], "melee_attack")
+    def __init__(self, group, game_state, pos, damage, range, dir, spread, duration, kill_mask, damage_mask):
+        super().__init__(group, game_state, pos, damage, duration, kill_mask, damage_mask, [pg.Surface((1, 1))], "melee_attack")
         # melee attack has no image, the player changes to a slashing animation instead
         self.image = pg.Surface((1, 1), pg.SRCALPHA)
         # filled image with a transparent color
         self.image.fill((0, 0, 0, 0))
         # stores range of the melee attack
-        self.range_squared = range * range
+        self.range = range
         # determines angle relative of horizontal of attack
-        if dir.x == 0:
-            angle = math.pi / 2 if dir.y > 0 else -math.pi / 2
-        else:
-            angle = math.atan(dir.y / dir.x) if dir.x > 0 else math.atan(dir.y / dir.x) + math.pi
+        angle = sector_angle(dir)
         # min and max angle considered within the angle boundaries based off of the attack angle
         self.angle_min, self.angle_max = angle - spread, angle + spread
 
     def update(self):
         self.frame_counter += 1
-        # collision with other sprites, uses special melee attack collision predicate
-        for sprite in pg.sprite.spritecollide(self, self.game_state.all_sprites, False,
-                                              collided=MeleeAttack.sector_collide):
+        # collision with nearby sprites whose centers are within the sector of the attack
+        for sprite in self.game_state.spatial_hash.query_sector(self.pos, self.range, self.angle_min, self.angle_max):
             self.collision_behavior(sprite)
         # destroys this melee attack sprite if the duration ha expired
         if self.frame_counter > self.damage_duration:
@@ -62,13 +38,12 @@ class MeleeAttack(DamageSource):
 
     def collision_behavior(self, entity):
         """Behavior when melee attack collides with an entity"""
-        for group in entity.groups():
-            if group in self.kill_list:
-                self.kill()
-            if group in self.damage_list:
-                # makes sure the sprite has this method, which should be inherited in all HealthEntity sprites
-                if hasattr(entity, "on_damage"):
-                    entity.on_damage(self)
+        if entity.collision_layer & self.kill_mask:
+            self.kill()
+        if entity.collision_layer & self.damage_mask:
+            # makes sure the sprite has this method, which should be inherited in all HealthEntity sprites
+            if hasattr(entity, "on_damage"):
+                entity.on_damage(self)
 
     def on_damage(self, entity):
         self.damage_flash(entity, MeleeAttack.DAMAGE_FLASH_COLOR)
@@ -82,9 +57,11 @@ class Projectile(DamageSource):
     """
     Projectile damage source, used for flying objects
     """
+    # whether hits on entities are tested against the opaque pixels of the image rather than the hit box
+    PIXEL_PERFECT = False
 
-    def __init__(self, group, game_state, pos, vel, damage, duration, kill_list, damage_list, images, name):
-        super().__init__(group, game_state, pos, damage, duration, kill_list, damage_list, images, name)
+    def __init__(self, group, game_state, pos, vel, damage, duration, kill_mask, damage_mask, images, name):
+        super().__init__(group, game_state, pos, damage, duration, kill_mask, damage_mask, images, name)
         # movement speed
         self.vel = vel
         # image of projectile
@@ -92,31 +69,24 @@ class Projectile(DamageSource):
             self.angle = math.pi / 2 if vel.y > 0 else -math.pi / 2
         else:
             self.angle = math.atan(vel.y / vel.x) if vel.x > 0 else math.atan(vel.y / vel.x) + math.pi
+        self.pixel_perfect = self.PIXEL_PERFECT
+        # movement, collision and leaving the screen are handled for all projectiles at once
+        self.game_state.projectile_system.add(self)
 
     def update(self):
-        """Update behavior of projectile"""
-        # movement update
-        self.pos += self.vel
+        """Update behavior of projectile, after the projectile system has moved it"""
         self.rect.center = self.pos.x, self.pos.y
         self.hit_box.center = self.pos.x, self.pos.y
         self.frame_counter += 1
         self.animate()
-        # collision with other sprites
-        for sprite in pg.sprite.spritecollide(self, self.game_state.all_sprites, False, collided=Entity.collided):
-            self.collision_behavior(sprite)
-        # out of screen bounds then deleted
-        if not (0 < self.pos.x < self.game_state.game.window_size[0] and 0 < self.pos.y <
-                self.game_state.game.window_size[1]):
-            self.kill()
 
     def collision_behavior(self, entity):
         """Behavior when melee attack collides with a sprite"""
-        for group in entity.groups():
-            if group in self.kill_list:
-                self.kill()
-            if group in self.damage_list:
-                if hasattr(entity, "on_damage"):
-                    entity.on_damage(self)
+        if entity.collision_layer & self.kill_mask:
+            self.kill()
+        if entity.collision_layer & self.damage_mask:
+            if hasattr(entity, "on_damage"):
+                entity.on_damage(self)
 
     def animate(self):
         pass
@@ -135,15 +105,14 @@ class Fireball(Projectile):
     ANIMATION_MODULUS = 4
     PARTICLE_TRAIL_RATE = 4  # rate of generating particles in particle trail
 
-    def __init__(self, group, game_state, pos, vel, damage, kill_list, damage_list):
-        super().__init__(group, game_state, pos, vel, damage, Fireball.BURN, kill_list, damage_list,
-                         [pg.transform.scale(image, (64, 64)) for image in
-                          [pg.image.load("assets/ability/fireball/fireball_{0}.png".format(x)) for x in
-                           ["0",
-                            "1",
-                            "2",
-                            "3"
-                            ]]], "fireball")
+    def __init__(self, group, game_state, pos, vel, damage, kill_mask, damage_mask):
+        super().__init__(group, game_state, pos, vel, damage, Fireball.BURN, kill_mask, damage_mask,
+                         asset_manager.load_frames(["assets/ability/fireball/fireball_{0}.png".format(x) for x in
+                                                    ["0",
+                                                     "1",
+                                                     "2",
+                                                     "3"
+                                                     ]], size=(64, 64)), "fireball")
         self.hit_box.size = 16, 16
         self.burn_counter = 0
 
@@ -167,7 +136,7 @@ class Fireball(Projectile):
     def animate(self):
         """Animates fireball sprite."""
         self.switch_image(self.images[(self.frame_counter // Fireball.ANIMATION_SPEED) % Fireball.ANIMATION_MODULUS])
-        self.image = pg.transform.rotate(self.image, -self.angle * 180 / math.pi + 90)
+        self.image = asset_manager.rotate(self.image, -self.angle * 180 / math.pi + 90)
         if self.frame_counter % Fireball.PARTICLE_TRAIL_RATE == 0:
             trail_pos = self.pos + Vector2(random.random() * 2 * self.hit_box.width / 2 - self.hit_box.width / 2,
                                            random.random() * 2 * self.hit_box.height / 2 - self.hit_box.height / 2)
@@ -176,12 +145,8 @@ class Fireball(Projectile):
 
     def burn_flash(self, entity, burn_color):
         """Burns enemy fading red to indicate burn as opposed to initial hit of fireball"""
-        entity_mask = pg.mask.from_surface(entity.image)
-        damage_mask = entity_mask.to_surface(setcolor=burn_color)
-        damage_mask.set_colorkey((0, 0, 0))
-        damage_mask.set_alpha(Fireball.BURN_MAX_ALPHA * (1 - self.burn_counter / Fireball.BURN_TIME))
-        entity.image = entity.image.copy()
-        entity.image.blit(damage_mask, (0, 0))
+        entity.image = asset_manager.tint(entity.image, burn_color,
+                                          Fireball.BURN_MAX_ALPHA * (1 - self.burn_counter / Fireball.BURN_TIME))
 
 
 class Root(Projectile):
@@ -196,16 +161,16 @@ class Root(Projectile):
     ANIMATION_MODULUS = 30
     PARTICLE_TRAIL_RATE = 4  # rate of generating particles in particle trail
 
-    def __init__(self, group, game_state, pos, vel, damage, kill_list, damage_list):
-        super().__init__(group, game_state, pos, vel, damage, Root.DURATION, kill_list, damage_list,
-                        [pg.transform.scale(image, (100, 100)) for image in
-                        [pg.image.load("assets/ability/Root/{0}.png".format(x)) for x in range (1,31)]], "root")
+    def __init__(self, group, game_state, pos, vel, damage, kill_mask, damage_mask):
+        super().__init__(group, game_state, pos, vel, damage, Root.DURATION, kill_mask, damage_mask,
+                         asset_manager.load_frames(["assets/ability/Root/{0}.png".format(x) for x in range(1, 31)],
+                                                   size=(100, 100)), "root")
         self.hit_box.size = 32,32
 
     def animate(self):
         """Animates fireball sprite."""
         self.switch_image(self.images[(self.frame_counter // Root.ANIMATION_SPEED) % Root.ANIMATION_MODULUS])
-        self.image = pg.transform.rotate(self.image, -self.angle * 180 / math.pi )
+        self.image = asset_manager.rotate(self.image, -self.angle * 180 / math.pi)
         if self.frame_counter % Root.PARTICLE_TRAIL_RATE == 0:
             trail_pos = self.pos - self.hit_box.width * 3 * Vector2(math.cos(self.angle), math.sin(self.angle)) + Vector2(random.random() * self.hit_box.width - self.hit_box.width / 2,
                                                                                                       random.random() * self.hit_box.height - self.hit_box.height / 2)
@@ -226,12 +191,7 @@ class Root(Projectile):
 
     def root_flash(self, entity, root_color):
         """roots enemy yellow"""
-        entity_mask = pg.mask.from_surface(entity.image)
-        damage_mask = entity_mask.to_surface(setcolor=root_color)
-        damage_mask.set_colorkey((0, 0, 0))
-        damage_mask.set_alpha(Root.ROOT_ALPHA)
-        entity.image = entity.image.copy()
-        entity.image.blit(damage_mask, (0, 0))
+        entity.image = asset_manager.tint(entity.image, root_color, Root.ROOT_ALPHA)
 
 
 class Hook(Projectile):
@@ -244,10 +204,9 @@ class Hook(Projectile):
     DURATION = 5  # duration that hooks pulls entity
     ROTATION_SPEED = 0.7  # radians per frame that image rotates
 
-    def __init__(self, group, game_state, pos, vel, damage, kill_list, damage_list):
-        super().__init__(group, game_state, pos, vel, damage, Hook.DURATION, kill_list, damage_list, 
-                         [pg.transform.scale(image, (36, 84)) for image in
-                          [pg.image.load("assets/ability/hook/weapon_axe.png")]], "hook")
+    def __init__(self, group, game_state, pos, vel, damage, kill_mask, damage_mask):
+        super().__init__(group, game_state, pos, vel, damage, Hook.DURATION, kill_mask, damage_mask, 
+                         asset_manager.load_frames(["assets/ability/hook/weapon_axe.png"], size=(36, 84)), "hook")
         self.hit_box.size = 16, 16
         self.rotation_speed = Hook.ROTATION_SPEED
 
@@ -264,35 +223,29 @@ class Hook(Projectile):
 
     def animate(self):
         self.angle += self.rotation_speed
-        del self.image
-        self.image = pg.transform.rotate(self.images[0], self.angle * 180 / math.pi)
+        self.image = asset_manager.rotate(self.images[0], self.angle * 180 / math.pi)
         self.rect = self.image.get_rect()
         self.rect.center = self.pos.x, self.pos.y
 
     def hook_flash(self, entity, color):
         """hooks enemy and makes green"""
-        entity_mask = pg.mask.from_surface(entity.image)
-        damage_mask = entity_mask.to_surface(setcolor=color)
-        damage_mask.set_colorkey((0, 0, 0))
-        damage_mask.set_alpha(Hook.ROOT_ALPHA)
-        entity.image = entity.image.copy()
-        entity.image.blit(damage_mask, (0, 0))
+        entity.image = asset_manager.tint(entity.image, color, Hook.ROOT_ALPHA)
 
 
 class Ability:
     """Base ability class for ability types, creates damage sources"""
 
-    def __init__(self, sprite, cooldown, kill_list, damage_list):
+    def __init__(self, sprite, cooldown, kill_mask, damage_mask):
         # sprite that has this ability
         self.sprite = sprite
         # ability cooldown
         self.cooldown = cooldown
         # previous frame of activation
         self.prev_activation = -cooldown
-        # list of sprite groups that damage sources will be killed on
-        self.kill_list = kill_list
-        # list of sprite groups that damage sources will be damaged on
-        self.damage_list = damage_list
+        # collision layers, as a CollisionLayer bitmask, that damage sources will be killed on
+        self.kill_mask = kill_mask
+        # collision layers, as a CollisionLayer bitmask, that damage sources will damage
+        self.damage_mask = damage_mask
 
     def activate(self, dir):
         "Ability is activated, run by game entity"
@@ -302,7 +255,7 @@ class Ability:
         """Determine if ability is off or own, used by an external entity"""
         return self.sprite.frame_counter - self.prev_activation > self.cooldown
 
-    def create_copy(self, entity, kill_list, damage_list):
+    def create_copy(self, entity, kill_mask, damage_mask):
         """"""
         pass
 
@@ -314,8 +267,8 @@ class ShootFireball(Ability):
     COOL_DOWN = 12  # ability cool down
     DAMAGE = 10  # fireball damage
 
-    def __init__(self, sprite, kill_list, damage_list):
-        super().__init__(sprite, ShootFireball.COOL_DOWN, kill_list, damage_list)
+    def __init__(self, sprite, kill_mask, damage_mask):
+        super().__init__(sprite, ShootFireball.COOL_DOWN, kill_mask, damage_mask)
         # list of fireball entities
         self.fireballs = []
         self.damage = ShootFireball.DAMAGE
@@ -341,11 +294,11 @@ class ShootFireball(Ability):
                                        pos=Vector2(self.sprite.pos.x, self.sprite.pos.y),
                                        vel=self.speed * randomized_dir,
                                        damage=self.damage,
-                                       kill_list=self.kill_list,
-                                       damage_list=self.damage_list))
+                                       kill_mask=self.kill_mask,
+                                       damage_mask=self.damage_mask))
 
-    def create_copy(self, entity, kill_list, damage_list):
-        return ShootFireball(entity, kill_list, damage_list)
+    def create_copy(self, entity, kill_mask, damage_mask):
+        return ShootFireball(entity, kill_mask, damage_mask)
 
 
 class ShootRoot(Ability):
@@ -355,8 +308,8 @@ class ShootRoot(Ability):
     DAMAGE = 34
     SHAKE_TIME = 3
 
-    def __init__(self, sprite, kill_list, damage_list):
-        super().__init__(sprite, ShootRoot.COOL_DOWN, kill_list, damage_list)
+    def __init__(self, sprite, kill_mask, damage_mask):
+        super().__init__(sprite, ShootRoot.COOL_DOWN, kill_mask, damage_mask)
         self.roots = []
 
     def activate(self, dir):
@@ -369,18 +322,18 @@ class ShootRoot(Ability):
                 self.roots.remove(root)
 
     def shoot(self, dir):
-        if self.sprite in self.sprite.game_state.player_group.sprites():
+        if self.sprite.collision_layer & CollisionLayer.PLAYER:
             self.sprite.game_state.shake_camera(ShootRoot.SHAKE_TIME)
         self.roots.append(Root(group=self.sprite.game_state.all_sprites,
                                game_state=self.sprite.game_state,
                                pos=Vector2(self.sprite.pos.x, self.sprite.pos.y),
                                vel=ShootRoot.ROOT_SPEED * dir,
                                damage=ShootRoot.DAMAGE,
-                               kill_list=self.kill_list,
-                               damage_list=self.damage_list))
+                               kill_mask=self.kill_mask,
+                               damage_mask=self.damage_mask))
 
-    def create_copy(self, sprite, kill_list, damage_list):
-        return ShootRoot(sprite, kill_list, damage_list)
+    def create_copy(self, sprite, kill_mask, damage_mask):
+        return ShootRoot(sprite, kill_mask, damage_mask)
 
 
 class ShootHook(Ability):
@@ -389,8 +342,8 @@ class ShootHook(Ability):
     COOL_DOWN = 90
     DAMAGE = 25
 
-    def __init__(self, sprite, kill_list, damage_list):
-        super().__init__(sprite, ShootHook.COOL_DOWN, kill_list, damage_list)
+    def __init__(self, sprite, kill_mask, damage_mask):
+        super().__init__(sprite, ShootHook.COOL_DOWN, kill_mask, damage_mask)
         self.hooks = []
 
     def activate(self, dir):
@@ -408,11 +361,11 @@ class ShootHook(Ability):
                                pos=Vector2(self.sprite.pos.x, self.sprite.pos.y),
                                vel=ShootHook.HOOK_SPEED * dir,
                                damage=ShootHook.DAMAGE,
-                               kill_list=self.kill_list,
-                               damage_list=self.damage_list))
+                               kill_mask=self.kill_mask,
+                               damage_mask=self.damage_mask))
 
-    def create_copy(self, sprite, kill_list, damage_list):
-        return ShootHook(sprite, kill_list, damage_list)
+    def create_copy(self, sprite, kill_mask, damage_mask):
+        return ShootHook(sprite, kill_mask, damage_mask)
 
 
 class MeleeAbility(Ability):
@@ -423,8 +376,8 @@ class MeleeAbility(Ability):
     SLASH_ANIMATION_LENGTH = 15
     DAMAGE = 10
 
-    def __init__(self, sprite, range, kill_list, damage_list):
-        super().__init__(sprite, MeleeAbility.COOL_DOWN, kill_list, damage_list)
+    def __init__(self, sprite, range, kill_mask, damage_mask):
+        super().__init__(sprite, MeleeAbility.COOL_DOWN, kill_mask, damage_mask)
         self.attack = None
         self.range = range
 
@@ -444,5 +397,5 @@ class MeleeAbility(Ability):
                                   dir=dir,
                                   spread=MeleeAbility.SPREAD,
                                   duration=MeleeAbility.DURATION,
-                                  kill_list=self.kill_list,
-                                  damage_list=self.damage_list)
+                                  kill_mask=self.kill_mask,
+                                  damage_mask=self.damage_mask)
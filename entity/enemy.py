@@ -3,16 +3,18 @@ from pygame.math import *
 from entity.ability import *
 from entity.game_entity import AbilityEntity
 from entity.game_entity import Entity
+from entity.game_entity import CollisionLayer
+import asset_manager
+import math
+import random
 
 
 class Enemy(AbilityEntity):
     """
     Generic enemies class that attacks player
     """
-
-    @staticmethod
-    def wall_collided(enemy, wall):
-        return enemy.wall_hit_box.colliderect(wall.hit_box)
+    SEPARATION_RADIUS = 56  # distance within which enemies push each other apart
+    SEPARATION_WEIGHT = 1.5  # strength of the push relative to steering towards the target
 
     def __init__(self, group, game_state, pos, ability, speed, health, images):
         super().__init__(group, game_state, pos, images, health, ability=ability)
@@ -20,12 +22,16 @@ class Enemy(AbilityEntity):
         self.speed = speed
         # movement direction
         self.dir = Vector2(0, 0)
+        # movement direction chosen on the last think step, kept between think steps
+        self.heading = Vector2(0, 0)
         # hit box
         self.hit_box.size = self.game_state.tile_size, self.game_state.tile_size
         # wall hit box for movement
         self.wall_hit_box = pg.Rect(self.hit_box.x, self.hit_box.y + self.hit_box.height / 2,
                                     self.hit_box.width, self.hit_box.height)
         self.facing_right = False
+        # left-facing animation frames
+        self.mirrored_images = asset_manager.mirror_frames(self.images)
 
     def update(self):
         self.frame_counter += 1
@@ -36,6 +42,9 @@ class Enemy(AbilityEntity):
     def steer(self, new_pos, min_dist=0, max_dist=None):
         """
         Steering behavior for movement towards pathfinding node.
+
+        Enemies are also pushed away from nearby enemies, so that enemies following the same path spread out instead of
+        stacking on the same tile.
         """
         displacement = (new_pos - self.pos)
         if max_dist is None:
@@ -44,6 +53,23 @@ class Enemy(AbilityEntity):
         else:
             if min_dist * min_dist < (self.game_state.player.pos - self.pos).magnitude_squared() < max_dist * max_dist:
                 self.dir = displacement.normalize()
+        self.dir += Enemy.SEPARATION_WEIGHT * self.separation()
+
+    def separation(self):
+        """Returns the push away from enemies closer than SEPARATION_RADIUS, stronger the closer they are."""
+        push = Vector2(0, 0)
+        # only looks at the enemies in nearby cells of the spatial hash
+        for other in self.game_state.spatial_hash.query_radius(self.pos, Enemy.SEPARATION_RADIUS):
+            if other is self or not other.collision_layer & CollisionLayer.ENEMY:
+                continue
+            offset = self.pos - other.pos
+            dist = offset.length()
+            if dist == 0:
+                # enemies on the exact same spot are pushed apart in a random direction
+                push += Vector2(1, 0).rotate(random.uniform(0, 360))
+            else:
+                push += offset * ((Enemy.SEPARATION_RADIUS - dist) / (Enemy.SEPARATION_RADIUS * dist))
+        return push
 
     def move(self):
         """
@@ -52,42 +78,27 @@ class Enemy(AbilityEntity):
         # movement
         if self.dir.magnitude_squared() != 0:
             self.dir = self.dir.normalize()
-        self.vel = self.speed * self.dir
-        self.pos += self.vel
-        self.hit_box.center = self.pos.x, self.pos.y
+        step = self.speed * self.dir
+        # moves along each axis separately, so that the enemy slides along walls it runs into
+        grid = self.game_state.tile_grid
         self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 2
-
-        # wall collision detection
-        if pg.sprite.spritecollideany(self, self.game_state.walls, collided=Enemy.wall_collided) is not None:
-            while pg.sprite.spritecollideany(self, self.game_state.walls, collided=Enemy.wall_collided) is not None:
-                self.pos -= self.dir
-                self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 2
-            # algorithm to include sliding along walls
-            # 0: left, 1: up, 2: right, 3: down
-            adj = [Vector2(-1, 0), Vector2(0, -1), Vector2(1, 0), Vector2(0, 1)]
-            x_collision = False
-            y_collision = False
-            for i, x in enumerate(adj):
-                adj_pos = self.pos + self.speed * x
-                self.wall_hit_box.center = adj_pos.x, adj_pos.y + self.hit_box.height / 2
-                if pg.sprite.spritecollideany(self, self.game_state.walls, collided=Enemy.wall_collided):
-                    if i % 2 == 0:
-                        x_collision = True
-                    else:
-                        y_collision = True
-
-            # only allow sliding along walls if this is not a corner collision
-            if x_collision and not y_collision:
-                self.vel.x = 0
-                if self.vel.length_squared() != 0:
-                    self.pos += self.speed * self.vel.normalize()
-            elif not x_collision and y_collision:
-                self.vel.y = 0
-                if self.vel.length_squared() != 0:
-                    self.pos += self.speed * self.vel.normalize()
-            else:
-                self.vel = Vector2(0, 0)
+        distance_x = grid.sweep(self.wall_hit_box, step.x, 0)
+        self.pos.x += distance_x
+        self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 2
+        if distance_x != step.x and step.y != 0:
+            # slides along the wall at full speed
+            step.y = math.copysign(self.speed, step.y)
+        distance_y = grid.sweep(self.wall_hit_box, step.y, 1)
+        self.pos.y += distance_y
+        self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 2
+        if distance_y != step.y and distance_x == step.x and step.x != 0:
+            # slides along the wall at full speed with the rest of the move
+            slide_x = grid.sweep(self.wall_hit_box, math.copysign(self.speed, step.x) - step.x, 0)
+            self.pos.x += slide_x
+            distance_x += slide_x
             self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 2
+        # velocity is the distance actually moved, so blocked enemies stand still in their animation
+        self.vel = Vector2(distance_x, distance_y)
 
         self.hit_box.center = self.pos.x, self.pos.y
         self.dir.update(0, 0)
@@ -107,64 +118,32 @@ class Pathfinder(Enemy):
         super().__init__(group, game_state, pos, ability, speed, health, images)
         # positions that object is pathing to
         self.pathing_nodes = []
-        # tile distances for pathfinding
-        self.tile_dist = []
 
     def path_find_to_player(self):
-        """Path finds to player"""
-        if self.game_state.player is not None:
-            self.path_find_to(self.game_state.player)
-
-    def path_find_to(self, entity):
+        """Path finds to player by stepping down the flow field shared by all enemies"""
+        if self.game_state.player is None:
+            return
         if not (0 < self.pos.x < self.game_state.game.window_size[0] and 0 < self.pos.y <
                 self.game_state.game.window_size[1]):
             return
-        """Pathfinding towards target sprite with BFS"""
-        # get positions of player and enemy in tile format
-        pos_tile = self.pos // self.game_state.tile_size
-        sprite_tile = Vector2(entity.pos.x % self.game_state.game.window_size[0],
-                              entity.pos.y % self.game_state.game.window_size[1]) // self.game_state.tile_size
-        # dimensions of the level
-        level_size = self.game_state.tile_dim
-        # bfs algorithm to pathfinding
-        visited = [[False for _ in range(level_size[0])] for _ in range(level_size[1])]
-        self.tile_dist = [[-1 for _ in range(level_size[0])] for _ in range(level_size[1])]
-        moves = [Vector2(-1, 0), Vector2(0, -1), Vector2(1, 0), Vector2(0, 1)]
-        queue = [pos_tile]
-        visited[int(pos_tile.y)][int(pos_tile.x)] = True
-        self.tile_dist[int(pos_tile.y)][int(pos_tile.x)] = 0
-        while len(queue) > 0:
-            v = queue.pop(0)
-            for move in moves:
-                u = v + move
-
-                # check if is in boundary
-                tile = self.game_state.level_creator.level[int(self.game_state.level_creator.stage.y * self.game_state.tile_dim[1] + u.y)][int(self.game_state.level_creator.stage.x * self.game_state.tile_dim[0] + u.x)]
-                if tile == "#" or tile == "S":
-                    continue
-
-                if 0 < u.x < level_size[0] and 0 < u.y < level_size[1] and not visited[int(u.y)][int(u.x)] and \
-                        self.tile_dist[int(u.y)][int(u.x)] == -1:
-                    queue.append(u)
-                    visited[int(u.y)][int(u.x)] = True
-                    self.tile_dist[int(u.y)][int(u.x)] = self.tile_dist[int(v.y)][int(v.x)] + 1
-
-        # reset pathfinding nodes for every updated BFS iteration
-        self.pathing_nodes = []
-        v = sprite_tile
-        self.pathing_nodes.insert(0, v)
-        while self.tile_dist[int(v.y)][int(v.x)] > 1:
-            for move in moves:
-                u = v + move
-                if self.game_state.level_creator.level[
-                    int(self.game_state.level_creator.stage.y * self.game_state.tile_dim[1] + u.y)][
-                    int(self.game_state.level_creator.stage.x * self.game_state.tile_dim[0] + u.x)] == "#":
-                    continue
-
-                if self.tile_dist[int(u.y)][int(u.x)] == self.tile_dist[int(v.y)][int(v.x)] - 1:
-                    self.pathing_nodes.insert(0, u)
-                    v = u
-                    break
+        if self.game_state.passability.path_clear(self.pos // self.game_state.tile_size, self.player_tile()):
+            # heads straight for the player without pathfinding when nothing is in the way
+            self.pathing_nodes = [self.player_tile()]
+            return
+        self.pathing_nodes = [self.game_state.flow_field.next_tile(self.pos // self.game_state.tile_size)]
+
+    def player_tile(self):
+        """Returns the tile of the player in the current stage."""
+        window_size = self.game_state.game.window_size
+        return Vector2(self.game_state.player.pos.x % window_size[0],
+                       self.game_state.player.pos.y % window_size[1]) // self.game_state.tile_size
+
+    def sees_player(self):
+        """
+        Checks if the straight line from the tile of the enemy to the tile of the player is clear of tiles that stop
+        projectiles. Spikes and movable blocks do not block sight, so this is only used for firing.
+        """
+        return self.game_state.passability.line_of_sight(self.pos // self.game_state.tile_size, self.player_tile())
 
 
 class ProjectileEnemy(Pathfinder):
@@ -178,12 +157,11 @@ class ProjectileEnemy(Pathfinder):
         self.firing = False
 
     def update(self):
-        # path finds to the player
-        self.path_find_to_player()
-        # steer towards the nearest node if it can path to the player
-        if len(self.pathing_nodes) > 0:
-            self.steer(self.pathing_nodes[0] * self.game_state.tile_size +
-                       Vector2(self.game_state.tile_size / 2, self.game_state.tile_size / 2), min_dist=self.range)
+        thinking = self.game_state.ai_scheduler.thinking(self)
+        if thinking:
+            self.think()
+        else:
+            self.dir.update(self.heading)
         self.animate()
         if self.damaged:
             self.damage_source.damaging(self)
@@ -193,8 +171,9 @@ class ProjectileEnemy(Pathfinder):
             self.rooted = False
 
         self.move()
-        self.firing = False
-        self.attack()
+        if thinking:
+            self.firing = False
+            self.attack()
         self.frame_counter += 1
         if self.vel.x > 0:
             self.facing_right = True
@@ -203,12 +182,22 @@ class ProjectileEnemy(Pathfinder):
         if self.health <= 0:
             self.death_behavior()
 
+    def think(self):
+        """Path finds and steers towards the player, run on the frames the AI scheduler picks."""
+        # path finds to the player
+        self.path_find_to_player()
+        # steer towards the nearest node if it can path to the player
+        if len(self.pathing_nodes) > 0:
+            self.steer(self.pathing_nodes[0] * self.game_state.tile_size +
+                       Vector2(self.game_state.tile_size / 2, self.game_state.tile_size / 2), min_dist=self.range)
+        self.heading.update(self.dir)
+
     def activate_ability(self):
         self.ability.activate((self.game_state.player.pos - self.pos).normalize())
 
     def attack(self):
-        """Attacks player within a certain range."""
-        if not self.game_state.player is None and not self.game_state.player.dead and (self.pos - self.game_state.player.pos).magnitude_squared() < self.range * self.range:
+        """Attacks player within a certain range and in clear sight."""
+        if not self.game_state.player is None and not self.game_state.player.dead and (self.pos - self.game_state.player.pos).magnitude_squared() < self.range * self.range and self.sees_player():
             self.activate_ability()
             self.firing = True
 
@@ -234,44 +223,32 @@ class FireMage(ProjectileEnemy):
         "firing": 0
     }
 
-    def __init__(self, group, game_state, pos, speed, health, range, attack_list):
-        super().__init__(group, game_state, pos, speed, health, range, ShootFireball(self, attack_list, attack_list),
+    def __init__(self, group, game_state, pos, speed, health, range, attack_mask):
+        super().__init__(group, game_state, pos, speed, health, range, ShootFireball(self, attack_mask, attack_mask),
                          FireMage.ABILITY_COOLDOWN,
-                         [pg.transform.scale(image, (image.get_width() * 4, image.get_height() * 4)) for image in
-                          [pg.image.load("assets/enemy/fire_mage/fire_mage_{0}.png".format(x)) for x in
-                           ["0",
-                            "1",
-                            "2",
-                            "3",
-                            "4",
-                            "5",
-                            "6",
-                            "7"
-                            ]]])
+                         asset_manager.load_frames(["assets/enemy/fire_mage/fire_mage_{0}.png".format(x) for x in
+                                                    ["0",
+                                                     "1",
+                                                     "2",
+                                                     "3",
+                                                     "4",
+                                                     "5",
+                                                     "6",
+                                                     "7"
+                                                     ]], scale=4))
 
     def animate(self):
         """Animates player sprite."""
+        images = self.images if self.facing_right else self.mirrored_images
         if self.firing:
-            new_image = self.images[((self.frame_counter // FireMage.ANIMATION_SPEED["firing"]) %
-                                     FireMage.ANIMATION_MODULI["firing"])]
-            if self.facing_right:
-                self.switch_image(new_image)
-            else:
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[((self.frame_counter // FireMage.ANIMATION_SPEED["firing"]) %
+                                      FireMage.ANIMATION_MODULI["firing"])])
         elif self.vel.length_squared() != 0:
-            new_image = self.images[((self.frame_counter // FireMage.ANIMATION_SPEED["moving"]) %
-                                     FireMage.ANIMATION_MODULI["moving"]) + FireMage.ANIMATION_OFFSETS["moving"]]
-            if self.facing_right:
-                self.switch_image(new_image)
-            else:
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[((self.frame_counter // FireMage.ANIMATION_SPEED["moving"]) %
+                                      FireMage.ANIMATION_MODULI["moving"]) + FireMage.ANIMATION_OFFSETS["moving"]])
         else:  # staying still animation
-            new_image = self.images[(self.frame_counter // FireMage.ANIMATION_SPEED["standing"]) %
-                                    FireMage.ANIMATION_MODULI["standing"]]
-            if self.facing_right:
-                self.switch_image(new_image)
-            elif not self.facing_right:  # storing animation
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[(self.frame_counter // FireMage.ANIMATION_SPEED["standing"]) %
+                                     FireMage.ANIMATION_MODULI["standing"]])
 
 
 class RootMage(ProjectileEnemy):
@@ -295,43 +272,31 @@ class RootMage(ProjectileEnemy):
     }
     ABILITY_COOLDOWN = 240
 
-    def __init__(self, group, game_state, pos, speed, health, range, attack_list):
-        super().__init__(group, game_state, pos, speed, health, range, ShootRoot(self, attack_list, attack_list), RootMage.ABILITY_COOLDOWN,
-                         [pg.transform.scale(image, (image.get_width() * 4, image.get_height() * 4)) for image in
-                          [pg.image.load("assets/enemy/root_mage/root_mage_{0}.png".format(x)) for x in
-                           ["0",
-                            "1",
-                            "2",
-                            "3",
-                            "4",
-                            "5",
-                            "6",
-                            "7"
-                            ]]])
+    def __init__(self, group, game_state, pos, speed, health, range, attack_mask):
+        super().__init__(group, game_state, pos, speed, health, range, ShootRoot(self, attack_mask, attack_mask), RootMage.ABILITY_COOLDOWN,
+                         asset_manager.load_frames(["assets/enemy/root_mage/root_mage_{0}.png".format(x) for x in
+                                                    ["0",
+                                                     "1",
+                                                     "2",
+                                                     "3",
+                                                     "4",
+                                                     "5",
+                                                     "6",
+                                                     "7"
+                                                     ]], scale=4))
 
     def animate(self):
         """Animates player sprite."""
+        images = self.images if self.facing_right else self.mirrored_images
         if self.firing:
-            new_image = self.images[((self.frame_counter // RootMage.ANIMATION_SPEED["firing"]) %
-                                     RootMage.ANIMATION_MODULI["firing"])]
-            if self.facing_right:
-                self.switch_image(new_image)
-            else:
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[((self.frame_counter // RootMage.ANIMATION_SPEED["firing"]) %
+                                      RootMage.ANIMATION_MODULI["firing"])])
         elif self.vel.length_squared() != 0:
-            new_image = self.images[((self.frame_counter // RootMage.ANIMATION_SPEED["moving"]) %
-                                     RootMage.ANIMATION_MODULI["moving"]) + RootMage.ANIMATION_OFFSETS["moving"]]
-            if self.facing_right:
-                self.switch_image(new_image)
-            else:
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[((self.frame_counter // RootMage.ANIMATION_SPEED["moving"]) %
+                                      RootMage.ANIMATION_MODULI["moving"]) + RootMage.ANIMATION_OFFSETS["moving"]])
         else:  # staying still animation
-            new_image = self.images[(self.frame_counter // RootMage.ANIMATION_SPEED["standing"]) %
-                                    RootMage.ANIMATION_MODULI["standing"]]
-            if self.facing_right:
-                self.switch_image(new_image)
-            elif not self.facing_right:  # storing animation
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[(self.frame_counter // RootMage.ANIMATION_SPEED["standing"]) %
+                                     RootMage.ANIMATION_MODULI["standing"]])
 
 
 class HookMage(ProjectileEnemy):
@@ -355,40 +320,28 @@ class HookMage(ProjectileEnemy):
     }
     ABILITY_COOLDOWN = ShootHook.COOL_DOWN
 
-    def __init__(self, group, game_state, pos, speed, health, range, attack_list):
-        super().__init__(group, game_state, pos, speed, health, range, ShootHook(self, attack_list, attack_list), HookMage.ABILITY_COOLDOWN,
-                         [pg.transform.scale(image, (image.get_width() * 4, image.get_height() * 4)) for image in
-                          [pg.image.load("assets/enemy/hook_mage/hook_mage_{0}.png".format(x)) for x in
-                           ["0",
-                            "1",
-                            "2",
-                            "3",
-                            "4",
-                            "5",
-                            "6",
-                            "7"
-                            ]]])
+    def __init__(self, group, game_state, pos, speed, health, range, attack_mask):
+        super().__init__(group, game_state, pos, speed, health, range, ShootHook(self, attack_mask, attack_mask), HookMage.ABILITY_COOLDOWN,
+                         asset_manager.load_frames(["assets/enemy/hook_mage/hook_mage_{0}.png".format(x) for x in
+                                                    ["0",
+                                                     "1",
+                                                     "2",
+                                                     "3",
+                                                     "4",
+                                                     "5",
+                                                     "6",
+                                                     "7"
+                                                     ]], scale=4))
 
     def animate(self):
         """Animates player sprite."""
+        images = self.images if self.facing_right else self.mirrored_images
         if self.firing:
-            new_image = self.images[((self.frame_counter // HookMage.ANIMATION_SPEED["firing"]) %
-                                     HookMage.ANIMATION_MODULI["firing"])]
-            if self.facing_right:
-                self.switch_image(new_image)
-            else:
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[((self.frame_counter // HookMage.ANIMATION_SPEED["firing"]) %
+                                      HookMage.ANIMATION_MODULI["firing"])])
         elif self.vel.length_squared() != 0:
-            new_image = self.images[((self.frame_counter // HookMage.ANIMATION_SPEED["moving"]) %
-                                     HookMage.ANIMATION_MODULI["moving"]) + HookMage.ANIMATION_OFFSETS["moving"]]
-            if self.facing_right:
-                self.switch_image(new_image)
-            else:
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[((self.frame_counter // HookMage.ANIMATION_SPEED["moving"]) %
+                                      HookMage.ANIMATION_MODULI["moving"]) + HookMage.ANIMATION_OFFSETS["moving"]])
         else:  # staying still animation
-            new_image = self.images[(self.frame_counter // HookMage.ANIMATION_SPEED["standing"]) %
-                                    HookMage.ANIMATION_MODULI["standing"]]
-            if self.facing_right:
-                self.switch_image(new_image)
-            elif not self.facing_right:  # storing animation
-                self.switch_image(pg.transform.flip(new_image, True, False))
+            self.switch_image(images[(self.frame_counter // HookMage.ANIMATION_SPEED["standing"]) %
+                                     HookMage.ANIMATION_MODULI["standing"]])
@@ -1,5 +1,18 @@
 import pygame as pg
 from pygame.math import *
+import asset_manager
+
+
+class CollisionLayer:
+    """
+    Collision layer bits. Every entity is on one layer, and damage sources hit the entities whose layers are in their
+    kill and damage masks, which are combinations of these bits.
+    """
+    NONE = 0
+    PLAYER = 1
+    ENEMY = 2
+    WALL = 4
+    MOVABLE = 8
 
 
 class Entity(pg.sprite.Sprite):
@@ -23,6 +36,8 @@ class Entity(pg.sprite.Sprite):
         self.rect.center = self.pos.x, self.pos.y
         self.hit_box = self.rect.copy()
         self.frame_counter = 0
+        # collision layer bit, set when the entity is placed
+        self.collision_layer = CollisionLayer.NONE
 
     def update(self):
         pass
@@ -70,18 +85,13 @@ class AbilityEntity(HealthEntity):
         self.secondary_ability_active = val
 
     def death_behavior(self):
-        if not self in self.game_state.player_group.sprites():
+        if not self.collision_layer & CollisionLayer.PLAYER:
             new_ability = self.ability.create_copy(self.game_state.player,
-                                                   [self.game_state.enemies, self.game_state.walls],
-                                                   [self.game_state.enemies])
+                                                   CollisionLayer.ENEMY | CollisionLayer.WALL,
+                                                   CollisionLayer.ENEMY)
             self.game_state.player.ability = new_ability
             if self.rooted:
-                entity_mask = pg.mask.from_surface(self.images[0].copy())
-                damage_mask = entity_mask.to_surface(setcolor=(255, 255, 200))
-                damage_mask.set_colorkey((0, 0, 0))
-                damage_mask.set_alpha(100)
-                rooted_image = self.images[0].copy()
-                rooted_image.blit(damage_mask, (0, 0))
+                rooted_image = asset_manager.tint(self.images[0], (255, 255, 200), 100)
                 self.game_state.level_creator.place_movable_with_image(int((self.pos / self.game_state.tile_size).x),
                                                                        int((self.pos / self.game_state.tile_size).y),
                                                                        rooted_image)
@@ -93,15 +103,15 @@ class DamageSource(Entity):
     """Base class for all game entities that do damage."""
     DAMAGE_FLASH_ALPHA = 200
 
-    def __init__(self, group, game_state, pos, damage, duration, kill_list, damage_list, images, name):
+    def __init__(self, group, game_state, pos, damage, duration, kill_mask, damage_mask, images, name):
         super().__init__(group, game_state, pos, images)
         # numerical damage value
         self.damage = damage
         # duration that other entities are considered in damage state
         self.name = name
         self.damage_duration = duration
-        self.kill_list = kill_list
-        self.damage_list = damage_list
+        self.kill_mask = kill_mask
+        self.damage_mask = damage_mask
 
     def on_damage(self, entity):
         """Behavior when sprite first takes damage fromm source"""
@@ -113,9 +123,4 @@ class DamageSource(Entity):
 
     def damage_flash(self, entity, color):
         """Flashes the entity white to indicate damage"""
-        entity_mask = pg.mask.from_surface(entity.image)
-        damage_mask = entity_mask.to_surface(setcolor=color)
-        damage_mask.set_colorkey((0, 0, 0))
-        damage_mask.set_alpha(DamageSource.DAMAGE_FLASH_ALPHA)
-        entity.image = entity.image.copy()
-        entity.image.blit(damage_mask, (0, 0))
+        entity.image = asset_manager.tint(entity.image, color, DamageSource.DAMAGE_FLASH_ALPHA)
@@ -2,6 +2,7 @@ from entity.ability import *
 from entity.wall import *
 from pygame.math import *
 import random
+import asset_manager
 
 
 class Fountain(Entity):
@@ -18,23 +19,21 @@ class Fountain(Entity):
                                       range(Fountain.PARTICLES_PER_CYCLE)]
         if color == "red":
             super().__init__(group, game_state, pos,
-                             [pg.transform.scale(image, (image.get_width() * 4, image.get_height() * 4)) for image in
-                              [pg.image.load("assets/map_ornament/fountain/red_fountain/red_fountain_{0}.png".format(x))
-                               for x in
-                               ["0",
-                                "1",
-                                "2"
-                                ]]])
+                             asset_manager.load_frames(
+                                 ["assets/map_ornament/fountain/red_fountain/red_fountain_{0}.png".format(x) for x in
+                                  ["0",
+                                   "1",
+                                   "2"
+                                   ]], scale=4))
             self.red = True
         else:
             super().__init__(group, game_state, pos,
-                             [pg.transform.scale(image, (image.get_width() * 4, image.get_height() * 4)) for image in
-                              [pg.image.load(
-                                  "assets/map_ornament/fountain/blue_fountain/blue_fountain_{0}.png".format(x)) for x in
-                               ["0",
-                                "1",
-                                "2"
-                                ]]])
+                             asset_manager.load_frames(
+                                 ["assets/map_ornament/fountain/blue_fountain/blue_fountain_{0}.png".format(x) for x in
+                                  ["0",
+                                   "1",
+                                   "2"
+                                   ]], scale=4))
             self.red = False
         self.pos.y -= self.game_state.tile_size
         self.rect.update(self.pos.x, self.pos.y, self.game_state.tile_size, 2 * self.game_state.tile_size)
@@ -64,37 +63,54 @@ class Fountain(Entity):
 
 
 class Movable(Entity):
+    """
+    Block pushed by the player from tile to tile.
+
+    A move reserves the destination tile in the tile grid when it starts and frees the origin tile when it ends, so the
+    block only needs to be drawn in between and resting blocks cost nothing.
+    """
     SPEED = 1
 
     def __init__(self, group, game_state, pos):
-        super().__init__(group, game_state, pos, [pg.transform.scale(pg.image.load('assets/map_ornament/movable/movable.png'), (64, 64))])
+        super().__init__(group, game_state, pos, asset_manager.load_frames(['assets/map_ornament/movable/movable.png'], size=(64, 64)))
         self.moving = False
         self.moving_timer = 0
         self.collision_direction = Vector2(0, 0)
         self.speed = Movable.SPEED
         self.moving_time = self.game_state.tile_size / self.speed
+        # tile centers the block is moving between
+        self.origin = self.pos.copy()
+        self.destination = self.pos.copy()
 
     def update(self):
+        if not self.moving:
+            return
+        self.moving_timer -= 1
         if self.moving_timer > 0:
-            self.vel = self.collision_direction.copy() * self.speed
-            self.moving_timer -= 1
+            self.pos.update(self.origin.lerp(self.destination, 1 - self.moving_timer / self.moving_time))
         else:
+            self.pos.update(self.destination)
             self.moving = False
-            self.vel = Vector2(0, 0)
-
-        self.pos += self.vel
+            # frees the origin tile once the block has left it
+            origin_box = self.hit_box.copy()
+            origin_box.center = self.origin.x, self.origin.y
+            self.game_state.tile_grid.unblock(origin_box)
         self.hit_box.center = self.pos.x, self.pos.y
-        if pg.sprite.spritecollideany(self, self.game_state.walls, collided=Entity.collided) is not None:
-            while pg.sprite.spritecollideany(self, self.game_state.walls, collided=Entity.collided) is not None:
-                if self.vel.magnitude_squared() != 0:
-                    self.pos -= self.vel.normalize()
-                self.hit_box.center = self.pos.x, self.pos.y
         self.rect.center = self.pos.x, self.pos.y
 
     def start_moving(self):
+        """Starts moving one tile along collision_direction, unless the destination tile is blocked or off the stage."""
         assert not self.moving, "Movable can not start moving while already moving"
+        destination_box = self.hit_box.move(self.collision_direction.x * self.game_state.tile_size,
+                                            self.collision_direction.y * self.game_state.tile_size)
+        if not pg.Rect((0, 0), self.game_state.game.window_size).contains(destination_box) or \
+                self.game_state.tile_grid.collides(destination_box):
+            return
+        self.game_state.tile_grid.block(destination_box)
         self.moving = True
         self.moving_timer = self.moving_time
+        self.origin = self.pos.copy()
+        self.destination = Vector2(destination_box.center)
 
 
 class Door(Entity):
@@ -102,16 +118,18 @@ class Door(Entity):
 
     def __init__(self, group, game_state, pos1, pos2, activation_condition):
         super().__init__(group, game_state, (pos1+pos2)/2,
-                         [
-                             pg.transform.scale(pg.image.load("assets/map_ornament/door/door_0.png"), (256, 192)),
-                             pg.transform.scale(pg.image.load("assets/map_ornament/door/door_1.png"), (256, 192))
-                         ])
+                         asset_manager.load_frames([
+                             "assets/map_ornament/door/door_0.png",
+                             "assets/map_ornament/door/door_1.png"
+                         ], size=(256, 192)))
         self.open = False
         self.interacting = False
         self.interact_timer = 0
         self.hit_box.size = pos2.x - pos1.x + self.game_state.tile_size, pos2.y - pos1.y + self.game_state.tile_size
         self.activation_condition = activation_condition
         self.will_close = False
+        # whether the door is currently in the walls and blocking its cells of the tile grid
+        self.blocking = False
         if self.hit_box.colliderect(self.game_state.player.wall_hit_box):
             self.open = True
             self.switch_image(self.images[1])
@@ -132,14 +150,25 @@ class Door(Entity):
             else:
                 self.interacting = False
 
-            if self.open:
-                self.game_state.walls.remove(self)
-            else:
-                self.game_state.walls.add(self)
+            # doors only block movement while closed
+            self.set_blocking(not self.open)
 
         self.hit_box.center = self.pos.x, self.pos.y
         self.rect.center = self.pos.x, self.pos.y
 
+    def set_blocking(self, blocking):
+        """Adds the door to or removes it from the walls and the tile grid."""
+        if blocking and not self.blocking:
+            self.game_state.walls.add(self)
+            self.collision_layer = CollisionLayer.WALL
+            self.hit_box.center = self.pos.x, self.pos.y
+            self.game_state.tile_grid.block(self.hit_box)
+        elif not blocking and self.blocking:
+            self.game_state.walls.remove(self)
+            self.collision_layer = CollisionLayer.NONE
+            self.game_state.tile_grid.unblock(self.hit_box)
+        self.blocking = blocking
+
     def open_door(self):
         if not self.open:
             self.interact()
@@ -168,9 +197,17 @@ class Door(Entity):
 
                 assert possible_moves != Vector2(0, 0), "Must need a possible move for the player"
 
-                while self.hit_box.colliderect(self.game_state.player.wall_hit_box):
-                    self.game_state.player.pos -= possible_moves
-                    self.game_state.player.wall_hit_box.center = self.game_state.player.pos.x, self.game_state.player.pos.y + self.game_state.player.hit_box.height / 4
+                # pushes the player out of the door against possible_moves in one step
+                player = self.game_state.player
+                if possible_moves.x > 0:
+                    player.pos.x -= player.wall_hit_box.right - self.hit_box.left
+                elif possible_moves.x < 0:
+                    player.pos.x += self.hit_box.right - player.wall_hit_box.left
+                elif possible_moves.y > 0:
+                    player.pos.y -= player.wall_hit_box.bottom - self.hit_box.top
+                else:
+                    player.pos.y += self.hit_box.bottom - player.wall_hit_box.top
+                player.wall_hit_box.center = player.pos.x, player.pos.y + player.hit_box.height / 4
 
             self.interact_timer = Door.ANIMATION_LENGTH
 
@@ -208,10 +245,10 @@ class ActivationCondition:
 
 class Lever(Entity):
     def __init__(self, group, game_state, pos):
-        super().__init__(group, game_state, pos, [
-            pg.transform.scale(pg.image.load('assets/map_ornament/lever/lever_0.png'), (64, 64)),
-            pg.transform.scale(pg.image.load('assets/map_ornament/lever/lever_1.png'), (64, 64)),
-        ])
+        super().__init__(group, game_state, pos, asset_manager.load_frames([
+            'assets/map_ornament/lever/lever_0.png',
+            'assets/map_ornament/lever/lever_1.png',
+        ], size=(64, 64)))
         self.hit_box.height = self.hit_box.height / 2
         self.hit_box.top = self.pos.y
         self.activated = False
@@ -234,7 +271,7 @@ class ArrowGun(Entity):
     def __init__(self, group, game_state, pos, damage, speed, dir, constant_firing, aiming, activation_condition):
         super().__init__(group, game_state, pos, [pg.Surface([1, 1])])
         self.image.fill((0, 0, 0, 0))
-        self.ability = ShootFireball(self, [self.game_state.walls, self.game_state.enemies, self.game_state.player_group, self.game_state.movables], [self.game_state.enemies, self.game_state.player_group])
+        self.ability = ShootFireball(self, CollisionLayer.WALL | CollisionLayer.ENEMY | CollisionLayer.PLAYER | CollisionLayer.MOVABLE, CollisionLayer.ENEMY | CollisionLayer.PLAYER)
         self.ability.damage = damage
         self.ability.speed = speed
         self.ability.spray_angle = 0
@@ -249,16 +286,12 @@ class ArrowGun(Entity):
         if self.activation_condition.condition(self.game_state):
             if self.constant_firing and self.frame_counter % self.firing_delay == 0:
                 if self.aiming:
-                    min_dist = self.game_state.game.window_size[0] * self.game_state.game.window_size[0] + self.game_state.game.window_size[1] * self.game_state.game.window_size[1]
-                    nearest_enemy = None
-                    for group in self.ability.damage_list:
-                        for sprite in group:
-                            dist = (sprite.pos - self.pos).length_squared()
-                            if dist <= min_dist:
-                                min_dist = dist
-                                nearest_enemy = sprite
-                    dir = (nearest_enemy.pos - self.pos).normalize()
-                    self.fire(dir)
+                    # aims at the nearest target anywhere on the screen, and holds fire if there is none
+                    nearest_enemy = self.game_state.spatial_hash.nearest(self.pos,
+                                                                         Vector2(self.game_state.game.window_size).length(),
+                                                                         self.ability.damage_mask)
+                    if nearest_enemy is not None and nearest_enemy.pos != self.pos:
+                        self.fire((nearest_enemy.pos - self.pos).normalize())
                 else:
                     self.fire(self.dir)
             self.frame_counter += 1
@@ -281,15 +314,14 @@ class Spike(DamageSource):
 
     """Spike that pops up from the ground and does damage to entities"""
 
-    def __init__(self, group, game_state, pos, damage, damage_list):
-        super().__init__(group, game_state, pos, damage, Spike.COOL_DOWN, [], damage_list,
-                         [pg.transform.scale(image, (64, 64)) for image in
-                          [pg.image.load("assets/map_ornament/spike/spike_{0}.png".format(x)) for x in
-                           ["0",
-                            "1",
-                            "2",
-                            "3"
-                            ]]],
+    def __init__(self, group, game_state, pos, damage, damage_mask):
+        super().__init__(group, game_state, pos, damage, Spike.COOL_DOWN, CollisionLayer.NONE, damage_mask,
+                         asset_manager.load_frames(["assets/map_ornament/spike/spike_{0}.png".format(x) for x in
+                                                    ["0",
+                                                     "1",
+                                                     "2",
+                                                     "3"
+                                                     ]], size=(64, 64)),
                          "spike")
         self.spike_up = False
         self.pos.y -= self.game_state.tile_size
@@ -311,15 +343,14 @@ class Spike(DamageSource):
         self.frame_counter += 1
         # collision with other sprites
         if self.spike_up and self.animation_counter == 0:
-            for sprite in pg.sprite.spritecollide(self, self.game_state.all_sprites, False, collided=Entity.collided):
+            for sprite in self.game_state.spatial_hash.query_rect(self.hit_box):
                 self.collision_behavior(sprite)
 
     def collision_behavior(self, entity):
         if self.cool_down_counter == 0:
-            for group in entity.groups():
-                if group in self.damage_list:
-                    if hasattr(entity, "on_damage"):
-                        entity.on_damage(self)
+            if entity.collision_layer & self.damage_mask:
+                if hasattr(entity, "on_damage"):
+                    entity.on_damage(self)
 
     def on_damage(self, entity):
         self.cool_down_counter = 180
@@ -2,9 +2,10 @@ import pygame as pg
 from pygame.math import *
 from entity.game_entity import AbilityEntity
 from entity.game_entity import Entity
+from entity.game_entity import CollisionLayer
 from gui import *
 from entity.particle import *
-from entity.map_ornament import Movable
+import asset_manager
 
 
 class Player(AbilityEntity):
@@ -27,28 +28,27 @@ class Player(AbilityEntity):
                          game_state=game_state,
                          pos=Vector2(200, 200),
                          images=
-                         [pg.transform.scale(image, (image.get_width() * 4, image.get_height() * 4)) for image in
-                          [pg.image.load("assets/player/player_{0}.png".format(x)) for x in
-                           ["0",
-                            "1",
-                            "2",
-                            "3",
-                            "4",
-                            "5",
-                            "6",
-                            "7",
-                            "8",
-                            "9",
-                            "10",
-                            "11",
-                            "12",
-                            "13",
-                            "14",
-                            "15",
-                            "16",
-                            "17",
-                            "18"
-                            ]]],
+                         asset_manager.load_frames(["assets/player/player_{0}.png".format(x) for x in
+                                                    ["0",
+                                                     "1",
+                                                     "2",
+                                                     "3",
+                                                     "4",
+                                                     "5",
+                                                     "6",
+                                                     "7",
+                                                     "8",
+                                                     "9",
+                                                     "10",
+                                                     "11",
+                                                     "12",
+                                                     "13",
+                                                     "14",
+                                                     "15",
+                                                     "16",
+                                                     "17",
+                                                     "18"
+                                                     ]], scale=4),
                          health=100)
         # hit box for walls only, allows the "head" of the player to be drawn above walls
         self.wall_hit_box = pg.Rect(self.hit_box.x, self.hit_box.y + self.hit_box.height / 2,
@@ -59,6 +59,8 @@ class Player(AbilityEntity):
         self.moving = False
         # different walking animations
         self.facing_right = True
+        # left-facing animation frames
+        self.mirrored_images = asset_manager.mirror_frames(self.images)
         # checks whether ability is active or not
         self.primary_ability_active = False
         self.secondary_ability_active = False
@@ -84,9 +86,14 @@ class Player(AbilityEntity):
         self.death_animation_counter = -1
         self.dead = False
 
-    @staticmethod
-    def wall_collided(player, wall):
-        return player.wall_hit_box.colliderect(wall.hit_box)
+    def push_movables(self, axis, distance):
+        """Pushes the resting movables that the player walks into after moving distance along an axis."""
+        step = 1 if self.vel[axis] > 0 else -1
+        probe = self.wall_hit_box.move((distance + step, 0) if axis == 0 else (0, distance + step))
+        for movable in self.game_state.spatial_hash.query_rect(probe):
+            if movable.collision_layer & CollisionLayer.MOVABLE and not movable.moving:
+                movable.collision_direction = Vector2(step, 0) if axis == 0 else Vector2(0, step)
+                movable.start_moving()
 
     def update(self):
         # dead
@@ -119,77 +126,17 @@ class Player(AbilityEntity):
         else:
             self.moving = False
         self.vel = self.speed * self.dir
-        self.pos += self.vel
-
-        self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 4
-        if pg.sprite.spritecollideany(self, self.game_state.walls, collided=Player.wall_collided) is not None:
-            while pg.sprite.spritecollideany(self, self.game_state.walls, collided=Player.wall_collided) is not None:
-                self.pos -= self.dir
-                self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 4
-            # algorithm to include sliding along walls
-            # 0: left, 1: up, 2: right, 3: down
-            adj = [Vector2(-1, 0), Vector2(0, -1), Vector2(1, 0), Vector2(0, 1)]
-            x_collision = False
-            y_collision = False
-            for i, x in enumerate(adj):
-                adj_pos = self.pos + self.speed * x
-                self.wall_hit_box.center = adj_pos.x, adj_pos.y + self.hit_box.height / 4
-                if pg.sprite.spritecollideany(self, self.game_state.walls, collided=Player.wall_collided):
-                    if i % 2 == 0:
-                        x_collision = True
-                    else:
-                        y_collision = True
-
-            # only allow sliding along walls if this is not a corner collision
-            if x_collision and not y_collision:
-                self.vel.x = 0
-                self.pos += self.vel
-            elif not x_collision and y_collision:
-                self.vel.y = 0
-                self.pos += self.vel
-            else:
-                self.vel = Vector2(0, 0)
-            if self.vel.magnitude_squared() == 0:
-                self.moving = False
+        # moves along each axis separately, stopping against walls and movables, so that the player slides along them
+        for axis in (0, 1):
             self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 4
-
-        collided_movables = pg.sprite.spritecollide(self, self.game_state.movables, False, collided=Player.wall_collided)
-        if len(collided_movables) > 0:
-            for movable in collided_movables:
-                assert isinstance(movable, Movable), "Movable group must only contain Movable objects"
-                x_collision = False
-                y_collision = False
-                collision_direction = Vector2(0, 0)
-                while self.wall_hit_box.colliderect(movable.hit_box):
-                    self.pos -= self.dir
-                    self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 4
-                # algorithm to include sliding along walls
-                # 0: left, 1: up, 2: right, 3: down
-                adj = [Vector2(-1, 0), Vector2(0, -1), Vector2(1, 0), Vector2(0, 1)]
-                for i, x in enumerate(adj):
-                    adj_pos = self.pos + self.speed * x
-                    self.wall_hit_box.center = adj_pos.x, adj_pos.y + self.hit_box.height / 4
-                    if self.wall_hit_box.colliderect(movable.hit_box):
-                        if i % 2 == 0:
-                            x_collision = True
-                        else:
-                            y_collision = True
-                        collision_direction += x
-
-                if movable.moving:
-                    # only allow sliding along walls if this is not a corner collision
-                    if x_collision and not y_collision:
-                        self.vel.x = 0
-                        self.pos += self.vel
-                    elif not x_collision and y_collision:
-                        self.vel.y = 0
-                        self.pos += self.vel
-                    else:
-                        self.vel = Vector2(0, 0)
-                    self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 4
-                else:
-                    movable.collision_direction = collision_direction.copy()
-                    movable.start_moving()
+            distance = self.game_state.tile_grid.sweep(self.wall_hit_box, self.vel[axis], axis)
+            if distance != self.vel[axis]:
+                self.push_movables(axis, distance)
+            self.vel[axis] = distance
+            self.pos[axis] += distance
+        self.wall_hit_box.center = self.pos.x, self.pos.y + self.hit_box.height / 4
+        if self.vel.magnitude_squared() == 0:
+            self.moving = False
 
         self.hit_box.center = self.pos.x, self.pos.y
 
@@ -228,30 +175,17 @@ class Player(AbilityEntity):
         if self.slashing:
             self.facing_right = (self.game_state.mouse_pos - self.pos).x > 0
             if self.slash_counter > 0:
-                if self.facing_right:
-                    self.switch_image(
-                        self.images[((self.slash_counter // Player.ANIMATION_SPEED["slashing"]) % 3) + 12])
-                else:
-                    self.switch_image(pg.transform.flip(
-                        self.images[((self.slash_counter // Player.ANIMATION_SPEED["slashing"]) % 3) + 12], True,
-                        False))
+                images = self.images if self.facing_right else self.mirrored_images
+                self.switch_image(images[((self.slash_counter // Player.ANIMATION_SPEED["slashing"]) % 3) + 12])
                 self.slash_counter -= 1
             else:
                 self.slashing = False
         elif self.moving:
-            if self.facing_right:
-                self.switch_image(self.images[((self.frame_counter // Player.ANIMATION_SPEED["moving"]) % 6) + 6])
-            else:
-                self.switch_image(
-                    pg.transform.flip(self.images[((self.frame_counter // Player.ANIMATION_SPEED["moving"]) % 6) + 6],
-                                      True, False))
+            images = self.images if self.facing_right else self.mirrored_images
+            self.switch_image(images[((self.frame_counter // Player.ANIMATION_SPEED["moving"]) % 6) + 6])
         else:  # staying still animation
-            if self.facing_right:
-                self.switch_image(self.images[(self.frame_counter // Player.ANIMATION_SPEED["standing"]) % 6])
-            elif not self.facing_right:  # storing animation
-                self.switch_image(
-                    pg.transform.flip(self.images[((self.frame_counter // Player.ANIMATION_SPEED["standing"]) % 6)],
-                                      True, False))
+            images = self.images if self.facing_right else self.mirrored_images
+            self.switch_image(images[(self.frame_counter // Player.ANIMATION_SPEED["standing"]) % 6])
 
     def check_screen_bounds(self):
         """manages behavior if player collides with edge of screen"""
@@ -5,12 +5,15 @@ from entity.game_entity import Entity
 class Wall(Entity):
     """
     Wall class that serves as barriers to players and enemies in a level.
+
+    A wall covers a rectangle of whole tiles, with pos at its top left corner, and is a single tile by default.
     """
-    def __init__(self, group, game_state, pos):
+    def __init__(self, group, game_state, pos, size=None):
         super().__init__(group, game_state, pos, [pg.Surface([0, 0], pg.SRCALPHA)])
-        self.rect.update(self.pos.x, self.pos.y, self.game_state.tile_size, self.game_state.tile_size)
-        self.hit_box.update(self.pos.x, self.pos.y, self.game_state.tile_size, self.game_state.tile_size)
+        self.size = (self.game_state.tile_size, self.game_state.tile_size) if size is None else size
+        self.rect.update(self.pos.x, self.pos.y, self.size[0], self.size[1])
+        self.hit_box.update(self.pos.x, self.pos.y, self.size[0], self.size[1])
 
     def update(self):
-        self.rect.update(self.pos.x, self.pos.y, self.game_state.tile_size, self.game_state.tile_size)
-        self.hit_box.update(self.pos.x, self.pos.y, self.game_state.tile_size, self.game_state.tile_size)
+        self.rect.update(self.pos.x, self.pos.y, self.size[0], self.size[1])
+        self.hit_box.update(self.pos.x, self.pos.y, self.size[0], self.size[1])
@@ -0,0 +1,90 @@
+from collections import deque
+from pygame.math import *
+
+
+class FlowField:
+    """
+    Distances in tiles from every tile of the current stage to the player's tile, shared by every pathfinding enemy.
+
+    The field is built with a single breadth-first search from the player's tile, so pathfinding costs the same for one
+    enemy as for a room full of them. It is only rebuilt when the player has moved to another tile or the map has changed
+    since it was built, as told by the tile grid and its revision, so most ticks do no search at all. Tiles blocked in
+    the passability grid of the game state are blocked.
+    """
+    # neighbouring tile offsets: left, up, right, down
+    MOVES = [(-1, 0), (0, -1), (1, 0), (0, 1)]
+
+    def __init__(self, game_state):
+        self.game_state = game_state
+        self.width, self.height = game_state.tile_dim
+        # distance of every tile to the target tile row by row, -1 where the target can not be reached
+        self.dist = [-1] * (self.width * self.height)
+        # tile the field leads to
+        self.target = (0, 0)
+        # (target tile, tile grid, grid revision) the field was built for
+        self.key = None
+        # whether the inputs of the field have to be checked before it is read again
+        self.stale = True
+
+    def invalidate(self):
+        """Marks the inputs of the field to be checked the next time it is read, called once every tick."""
+        self.stale = True
+
+    def refresh(self):
+        """Rebuilds the field if the player's tile or the map changed since it was built."""
+        game_state = self.game_state
+        player_pos = game_state.player.pos
+        window_size = game_state.game.window_size
+        target = (int(player_pos.x % window_size[0] // game_state.tile_size),
+                  int(player_pos.y % window_size[1] // game_state.tile_size))
+        key = (target, game_state.tile_grid, game_state.tile_grid.revision)
+        if key != self.key:
+            game_state.passability.refresh()
+            self.target = target
+            self.update()
+            self.key = key
+        self.stale = False
+
+    def update(self):
+        """Rebuilds the field from the target tile."""
+        blocked = self.game_state.passability.cells
+        width, height = self.width, self.height
+        dist = [-1] * (width * height)
+        dist[self.target[1] * width + self.target[0]] = 0
+        queue = deque([self.target])
+        while queue:
+            x, y = queue.popleft()
+            next_dist = dist[y * width + x] + 1
+            for move_x, move_y in FlowField.MOVES:
+                u_x, u_y = x + move_x, y + move_y
+                if not (0 <= u_x < width and 0 <= u_y < height) or dist[u_y * width + u_x] != -1:
+                    continue
+                if blocked[u_y * width + u_x]:
+                    continue
+                dist[u_y * width + u_x] = next_dist
+                queue.append((u_x, u_y))
+        self.dist = dist
+
+    def next_tile(self, tile):
+        """
+        Returns the tile to move to from a tile to get closer to the player, the player's tile itself if the player is
+        adjacent, unreachable, or if the tile is the player's.
+        """
+        if self.stale:
+            self.refresh()
+        x, y = int(tile.x), int(tile.y)
+        width, height = self.width, self.height
+        best_tile = self.target
+        best_dist = self.dist[y * width + x] if 0 <= x < width and 0 <= y < height else -1
+        if best_dist == 0:
+            return Vector2(self.target)
+        for move_x, move_y in FlowField.MOVES:
+            u_x, u_y = x + move_x, y + move_y
+            if not (0 <= u_x < width and 0 <= u_y < height):
+                continue
+            u_dist = self.dist[u_y * width + u_x]
+            # steps down the field, or out of a blocked tile onto the closest reachable neighbour
+            if u_dist != -1 and (best_dist == -1 or u_dist < best_dist):
+                best_tile = (u_x, u_y)
+                best_dist = u_dist
+        return Vector2(best_tile)
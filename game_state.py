@@ -1,4 +1,11 @@
 import controls
+import asset_manager
+import startup_profile
+from spatial_hash import SpatialHash
+from projectile_system import ProjectileSystem
+from flow_field import FlowField
+from passability_grid import PassabilityGrid
+from ai_scheduler import AIScheduler
 from level_creator import *
 from entity.player import *
 from gui import *
@@ -40,7 +47,7 @@ class GameStateManager:
         self.game = game
         # active game states in a stack - top of stack is looping game currently
         self.state_stack = [start_state]
-        # inactive game states in a pool
+        # inactive game states in a pool, states that have not been built yet are stored as factories
         self.pool = pool
 
     def exit_state(self):
@@ -52,15 +59,36 @@ class GameStateManager:
         self.state_stack.append(new_state)
         self.current_state().load()
 
+    def pooled_state(self, name):
+        """Returns a pooled game state, building it from its factory if it has not been built yet."""
+        state = self.pool[name]
+        if not isinstance(state, GameState):
+            state = self.build_state(name, state)
+        self.pool[name] = state
+        return state
+
+    def build_state(self, name, factory):
+        with startup_profile.timed("state", name):
+            return factory()
+
+    def warm_up(self, name):
+        """
+        Starts decoding the images of a pooled game state in the background, so that building it later does not wait on
+        disk. The state itself is built on the main thread when it is entered, since building it creates and converts
+        surfaces and fills the asset caches that the running state uses.
+        """
+        if not isinstance(self.pool[name], GameState) and name in asset_manager.ASSET_GROUPS:
+            asset_manager.preload(name)
+
     def enter_state_from_pool(self, name):
-        self.enter_state(self.pool[name])
+        self.enter_state(self.pooled_state(name))
 
     def switch_state(self, new_state):
         self.exit_state()
         self.enter_state(new_state)
 
     def switch_state_from_pool(self, name):
-        self.switch_state(self.pool[name])
+        self.switch_state(self.pooled_state(name))
 
     def current_state(self):
         return self.state_stack[-1]
@@ -155,9 +183,7 @@ class PlayingState(GameState):
         self.tile_size = 64
         self.tile_dim = int(self.game.window_size[0] / self.tile_size), int(self.game.window_size[1] / self.tile_size)
         # game background
-        background_image = pg.image.load("assets/map/playing_state_map_0.png")
-        self.background = pg.transform.scale(background_image,
-                                             (background_image.get_width() * 4, background_image.get_height() * 4))
+        self.background = asset_manager.load_image("assets/map/playing_state_map_0.png", scale=4)
         self.on_camera_background = pg.Surface([self.shake_screen.get_width() + 2 * self.tile_size, self.shake_screen.get_height() + 2 * self.tile_size])
         # void background_color
         self.void_color = (41, 41, 54)
@@ -172,8 +198,11 @@ class PlayingState(GameState):
         # player sprite group
         self.player_group = pg.sprite.Group()
         self.player_group.add(self.player)
+        self.player.collision_layer = CollisionLayer.PLAYER
         # wall sprites for collision
         self.walls = pg.sprite.Group()
+        # passability grid for collision with walls, built by the level creator for every stage
+        self.tile_grid = None
         # movable objects
         self.movables = pg.sprite.Group()
         # door objects
@@ -184,23 +213,36 @@ class PlayingState(GameState):
         self.arrow_shooters = pg.sprite.Group()
         # enemy sprites
         self.enemies = pg.sprite.Group()
+        # sprites that damage sources collide with, bucketed by position
+        self.spatial_hash = SpatialHash([self.player_group, self.enemies, self.movables, self.walls], self.tile_size,
+                                        self.tile_size // 4)
+        # positions and hits of all projectiles
+        self.projectile_system = ProjectileSystem(self)
+        # spreads enemy think steps across frames
+        self.ai_scheduler = AIScheduler(self)
+        # whole-tile passability of the current stage for pathfinding
+        self.passability = PassabilityGrid(self)
+        # distances to the player shared by all pathfinding enemies
+        self.flow_field = FlowField(self)
         # particle sprites
         self.particles = pg.sprite.Group()
         # set controls
         self.controls = controls.PlayingControls(self.game)
 
+        # second level background is large, so it is decoded in the background before the player reaches it
+        asset_manager.preload("level_1")
         # example level
         self.level = 0
         self.level_creator.create_level(self.level_creator.load_from_file('level_0.txt'))
-        self.player.ability = MeleeAbility(self.player, 100, [self.enemies], [self.enemies])
-        self.player.secondary_ability = MeleeAbility(self.player, 100, [self.enemies], [self.enemies])
+        self.player.ability = MeleeAbility(self.player, 100, CollisionLayer.ENEMY, CollisionLayer.ENEMY)
+        self.player.secondary_ability = MeleeAbility(self.player, 100, CollisionLayer.ENEMY, CollisionLayer.ENEMY)
 
         # check if screen has been entirely updated after shaking
         self.post_shake_screen_update = False
 
         # menu gui
         self.ability_indicator = IndicatorBar(self.gui_sprites, Vector2(16, 80), (64, 64), 
-                                              [pg.image.load(f"assets/gui/ability_icon/{name}.png") for name in
+                                              [asset_manager.load_image(f"assets/gui/ability_icon/{name}.png") for name in
                                                ["melee",
                                                 "shoot_fireball",
                                                 "shoot_root",
@@ -222,6 +264,10 @@ class PlayingState(GameState):
 
     def update(self):
         """Updates all game objects based on input."""
+        self.spatial_hash.rebuild()
+        self.flow_field.invalidate()
+        self.projectile_system.update()
+        self.ai_scheduler.schedule()
         # updates game sprites
         self.all_sprites.update()
         # updates gui sprites
@@ -324,11 +370,14 @@ class PlayingState(GameState):
         self.shake_timer_max = time
 
     def load_level(self, level):
-        background_image = pg.image.load(f"assets/map/playing_state_map_{level}.png")
-        self.background = pg.transform.scale(background_image,
-                                             (background_image.get_width() * 4, background_image.get_height() * 4))
+        # removes the sprites of the previous level before the new one is placed, so the collision grid of the new stage
+        # only holds its own blockers
+        for sprite in self.all_sprites.sprites():
+            if not sprite.collision_layer & CollisionLayer.PLAYER:
+                sprite.kill()
+        self.background = asset_manager.load_image(f"assets/map/playing_state_map_{level}.png", scale=4)
+        # creating the level also loads its first stage
         self.level_creator.create_level(self.level_creator.load_from_file(f'level_{level}.txt'))
-        self.level_creator.load_stage()
         self.on_camera_background.fill(self.void_color)
         self.on_camera_background.blit(self.background, (0, 0),
                                        (int(self.level_creator.stage.x * self.tile_dim[0] - 1) * self.tile_size,
@@ -341,9 +390,6 @@ class PlayingState(GameState):
         pg.display.update(rect)
         if level == 1:
             self.camera_pos = Vector2(0, 0)
-        for sprite in self.all_sprites.sprites():
-            if not sprite in self.player_group.sprites():
-                sprite.kill()
 
 
 
@@ -392,8 +438,16 @@ class StartMenu(SelectionMenu):
         self.map_ornaments = pg.sprite.Group()
         # wall sprites for collision
         self.walls = pg.sprite.Group()
+        # passability grid for collision with walls, built by the level creator for every stage
+        self.tile_grid = None
         # enemy sprites
         self.enemies = pg.sprite.Group()
+        # sprites that damage sources collide with, bucketed by position
+        self.spatial_hash = SpatialHash([self.enemies, self.walls], self.tile_size, self.tile_size // 4)
+        # positions and hits of all projectiles
+        self.projectile_system = ProjectileSystem(self)
+        # spreads enemy think steps across frames
+        self.ai_scheduler = AIScheduler(self)
         # particle sprites
         self.particles = pg.sprite.Group()
         self.player = None
@@ -408,7 +462,7 @@ class StartMenu(SelectionMenu):
         self.camera_acc = Vector2(0, 0)
         self.camera_vel = Vector2(0, 0)
         # sets up start menu map
-        self.background = pg.transform.scale(pg.image.load("assets/map/start_menu_map_0.png"), (self.game.window_size[0] * 3, self.game.window_size[1] * 3))
+        self.background = asset_manager.load_image("assets/map/start_menu_map_0.png", size=(self.game.window_size[0] * 3, self.game.window_size[1] * 3))
         self.game.screen.blit(self.background, (0, 0), (
             self.game.window_size[0] + self.camera_pos.x,
             self.game.window_size[1] + self.camera_pos.y,
@@ -417,22 +471,27 @@ class StartMenu(SelectionMenu):
         ))
         pg.display.update(self.background.get_rect())
         self.title_box = Box(self, self.gui_sprites, Vector2(self.game.window_size[0] / 2, self.game.window_size[1] * 1/2),
-                       pg.image.load("assets/gui/menu/start_menu/start_menu_base.png"))
+                       asset_manager.load_image("assets/gui/menu/start_menu/start_menu_base.png"))
         # sets controls
         self.controls = controls.StartMenuControls(self.game)
         self.selections = [
             ClickableButton(self.gui_sprites, self, Vector2(self.game.window_size[0] * 0.5, self.game.window_size[1] * 4/8), lambda: self.game.game_state_manager.switch_state_from_pool("playing"),
-                            [pg.image.load(f"assets/gui/button/play/play_{x}.png") for x in ["0", "1"]]),
+                            [asset_manager.load_image(f"assets/gui/button/play/play_{x}.png") for x in ["0", "1"]]),
             ClickableButton(self.gui_sprites, self, Vector2(self.game.window_size[0] * 0.5, self.game.window_size[1] * 5/8), lambda: self.game.stop(),
-                            [pg.image.load(f"assets/gui/button/quit/quit_{x}.png") for x in ["0", "1"]]),
+                            [asset_manager.load_image(f"assets/gui/button/quit/quit_{x}.png") for x in ["0", "1"]]),
         ]
         # creates new level
         self.level_creator = LevelCreator(self, Vector2(1, 1))
         self.level_creator.level = self.level_creator.load_from_file('start_menu_level.txt')
         self.level_creator.load_stage()
+        # decodes the images of the playing state in the background while the start menu is shown
+        self.game.game_state_manager.warm_up("playing")
 
     def update(self):
         """Update step in game state loop."""
+        self.spatial_hash.rebuild()
+        self.projectile_system.update()
+        self.ai_scheduler.schedule()
         # updates game sprites
         self.all_sprites.update()
         # update GUI sprites
@@ -456,6 +515,8 @@ class StartMenu(SelectionMenu):
             self.camera_pos -= self.camera_vel
         for sprite in self.all_sprites.sprites():
             sprite.pos -= self.camera_vel
+        self.tile_grid.offset -= self.camera_vel
+        self.projectile_system.translate(-self.camera_vel)
         self.prev_mouse_pos = self.mouse_pos[0], self.mouse_pos[1]
 
     def render(self):
@@ -511,14 +572,14 @@ class PauseMenu(SelectionMenu):
         self.controls = controls.PauseMenuControls(self.game)
         # adds pause menu buttons
         self.box = Box(self, self.gui_sprites, Vector2(self.game.window_size[0] / 2, self.game.window_size[1] / 2),
-                       pg.image.load("assets/gui/menu/pause_menu/pause_menu_base.png"))
+                       asset_manager.load_image("assets/gui/menu/pause_menu/pause_menu_base.png"))
         self.selections = [
             ClickableButton(self.gui_sprites, self, Vector2(self.game.window_size[0] / 2, 220),
                             lambda: self.game.game_state_manager.switch_state_from_pool("playing"),
-                            [pg.image.load(f"assets/gui/button/resume_game/resume_game_{x}.png") for x in ["0", "1"]]),
+                            [asset_manager.load_image(f"assets/gui/button/resume_game/resume_game_{x}.png") for x in ["0", "1"]]),
             ClickableButton(self.gui_sprites, self, Vector2(self.game.window_size[0] / 2, 326),
                             lambda: self.quit_to_menu(),
-                            [pg.image.load(f"assets/gui/button/quit/quit_{x}.png") for x in ["0", "1"]]),
+                            [asset_manager.load_image(f"assets/gui/button/quit/quit_{x}.png") for x in ["0", "1"]]),
         ]
 
     def quit_to_menu(self):
@@ -544,12 +605,12 @@ class GameOverMenu(SelectionMenu):
         tint.set_alpha(200)
         self.background.blit(tint, (0, 0))
         self.box = Box(self, self.gui_sprites, Vector2(self.game.window_size[0] / 2, self.game.window_size[1] / 2),
-                       pg.transform.scale(pg.image.load(f"assets/gui/menu/game_over_menu/game_over_menu.png"), (720, 384)))
+                       asset_manager.load_image(f"assets/gui/menu/game_over_menu/game_over_menu.png", size=(720, 384)))
         self.game.screen.blit(self.background, (0, 0))
         pg.display.update(self.background.get_rect())
         self.selections = [
             ClickableButton(self.gui_sprites, self, Vector2(self.game.window_size[0] / 2, self.game.window_size[1] / 2), lambda: self.reset_game(),
-                             [pg.image.load(f"assets/gui/button/quit_to_menu/quit_to_menu_{x}.png") for x in
+                             [asset_manager.load_image(f"assets/gui/button/quit_to_menu/quit_to_menu_{x}.png") for x in
                               ["0",
                                "1"
                                ]])
@@ -559,7 +620,7 @@ class GameOverMenu(SelectionMenu):
         # resets game and deletes all sprites
         self.game.game_state_manager.exit_state()
         del self.game.game_state_manager.pool["playing"]
-        self.game.game_state_manager.pool["playing"] = PlayingState(self.game, "playing")
+        self.game.game_state_manager.pool["playing"] = lambda: PlayingState(self.game, "playing")
         self.game.game_state_manager.enter_state_from_pool("start_menu")
 
 
@@ -581,13 +642,13 @@ class GameWinMenu(SelectionMenu):
         self.background.blit(tint, (0, 0))
         # adds game win menu box to indicate win
         self.box = Box(self, self.gui_sprites, Vector2(self.game.window_size[0] / 2, self.game.window_size[1] / 2),
-                       pg.image.load(f"assets/gui/menu/game_win_menu/game_win_menu.png"))
+                       asset_manager.load_image(f"assets/gui/menu/game_win_menu/game_win_menu.png"))
         self.game.screen.blit(self.background, (0, 0))
         pg.display.update(self.background.get_rect())
         # ads buttons to the game win menu
         self.selections = [
             ClickableButton(self.gui_sprites, self, Vector2(self.game.window_size[0] / 2, self.game.window_size[1] * 18 / 25), lambda: self.reset_game(),
-                             [pg.image.load(f"assets/gui/button/quit_to_menu/quit_to_menu_{x}.png") for x in
+                             [asset_manager.load_image(f"assets/gui/button/quit_to_menu/quit_to_menu_{x}.png") for x in
                               ["0",
                                "1"
                                ]])
@@ -597,5 +658,5 @@ class GameWinMenu(SelectionMenu):
         # resets game and deletes all sprites
         self.game.game_state_manager.exit_state()
         del self.game.game_state_manager.pool["playing"]
-        self.game.game_state_manager.pool["playing"] = PlayingState(self.game, "playing")
+        self.game.game_state_manager.pool["playing"] = lambda: PlayingState(self.game, "playing")
         self.game.game_state_manager.enter_state_from_pool("start_menu")
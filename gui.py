@@ -1,4 +1,5 @@
 import pygame as pg
+import asset_manager
 
 
 class Button(pg.sprite.Sprite):
@@ -21,9 +22,9 @@ class TextButton(Button):
     """Button class with a text image and associated function that is executed on demand."""
     def __init__(self, group, game_state, pos, function, size, color, text, font='arialunicode'):
         self.size = size
-        self.font = pg.font.SysFont(font, self.size)
+        self.font = asset_manager.load_font(font, self.size)
         self.text = text
-        super().__init__(group, game_state, pos, function, [self.font.render(self.text, False, color)])
+        super().__init__(group, game_state, pos, function, [asset_manager.render_text(self.text, self.size, color, font)])
 
 
 class ClickableButton(Button):
@@ -54,12 +55,7 @@ class ClickableButton(Button):
 
     def hover_mask(self, color):
         """Masks the entity a color to indicate hovering"""
-        button_mask = pg.mask.from_surface(self.image)
-        damage_mask = button_mask.to_surface(setcolor=color)
-        damage_mask.set_colorkey((0, 0, 0))
-        damage_mask.set_alpha(ClickableButton.HOVER_ALPHA)
-        self.image = self.image.copy()
-        self.image.blit(damage_mask, (0, 0))
+        self.image = asset_manager.tint(self.image, color, ClickableButton.HOVER_ALPHA)
 
 
 class Box(pg.sprite.Sprite):
@@ -2,7 +2,9 @@ from entity.wall import *
 from entity.enemy import *
 from entity.ability import *
 from entity.map_ornament import *
+from tile_grid import TileGrid
 import copy
+import startup_profile
 
 
 class LevelCreator:
@@ -18,7 +20,7 @@ class LevelCreator:
         self.stage = stage
         # dict associating string tile key with level creator method to place object in-game
         self.LEVEL_KEY = {
-            "#": self.place_wall,
+            "#": self.mark_wall,
             "P": self.place_player,
             "M": self.place_melee,
             "F": self.place_fire_mage,
@@ -32,7 +34,10 @@ class LevelCreator:
         }
         # information for placing doors and levers
         self.stage_function_information = {}
+        # wall tiles of the stage being loaded, placed as merged rectangles once the whole stage is read
+        self.wall_tiles = set()
 
+    @startup_profile.profiled("level")
     def create_level(self, level_data):
         """
         Arguments
@@ -125,13 +130,18 @@ class LevelCreator:
 
         self.load_stage()
 
+    @startup_profile.profiled("level")
     def load_stage(self):
+        # static collision grid of the new stage, filled in as walls are placed
+        self.game_state.tile_grid = TileGrid(self.game_state.tile_dim, self.game_state.tile_size)
+        self.wall_tiles.clear()
         for tile_y in range(self.game_state.tile_dim[1]):
             for tile_x in range(self.game_state.tile_dim[0]):
                 tile = self.level[int(self.stage.y) * self.game_state.tile_dim[1] + tile_y][
                     int(self.stage.x) * self.game_state.tile_dim[0] + tile_x]
                 if not self.LEVEL_KEY.get(tile) is None:
                     self.LEVEL_KEY[tile](tile_x, tile_y)
+        self.place_walls()
 
         for f_info in self.stage_function_information.get((int(self.stage.x), int(self.stage.y)), []):
             if f_info[0] == "door":
@@ -150,12 +160,42 @@ class LevelCreator:
         """Creates 2D array of characters from single string with newlines."""
         return [list(row) for row in level_string.split("\n")]
 
-    def place_wall(self, tile_x, tile_y):
-        """Places a wall object at tile location."""
-        self.game_state.walls.add(Wall(group=self.game_state.all_sprites,
-                                       game_state=self.game_state,
-                                       pos=Vector2(tile_x * self.game_state.tile_size,
-                                                   tile_y * self.game_state.tile_size)))
+    def mark_wall(self, tile_x, tile_y):
+        """Marks a wall tile, to be merged with its neighbours by place_walls."""
+        self.wall_tiles.add((tile_x, tile_y))
+
+    def place_walls(self):
+        """
+        Places the marked wall tiles as few rectangular walls.
+
+        Greedily grows a rectangle from the top left-most wall tile not yet covered, first along its row and then down
+        for as many rows as the full width is wall, and repeats until every wall tile is covered.
+        """
+        covered = set()
+        for tile_y in range(self.game_state.tile_dim[1]):
+            for tile_x in range(self.game_state.tile_dim[0]):
+                if (tile_x, tile_y) not in self.wall_tiles or (tile_x, tile_y) in covered:
+                    continue
+                width = 1
+                while (tile_x + width, tile_y) in self.wall_tiles and (tile_x + width, tile_y) not in covered:
+                    width += 1
+                height = 1
+                while all((x, tile_y + height) in self.wall_tiles and (x, tile_y + height) not in covered
+                          for x in range(tile_x, tile_x + width)):
+                    height += 1
+                covered.update((x, y) for x in range(tile_x, tile_x + width) for y in range(tile_y, tile_y + height))
+                self.place_wall(tile_x, tile_y, width, height)
+
+    def place_wall(self, tile_x, tile_y, tile_width=1, tile_height=1):
+        """Places a wall object covering a rectangle of tiles, with its top left at tile location."""
+        wall = Wall(group=self.game_state.all_sprites,
+                    game_state=self.game_state,
+                    pos=Vector2(tile_x * self.game_state.tile_size,
+                                tile_y * self.game_state.tile_size),
+                    size=(tile_width * self.game_state.tile_size, tile_height * self.game_state.tile_size))
+        wall.collision_layer = CollisionLayer.WALL
+        self.game_state.walls.add(wall)
+        self.game_state.tile_grid.block(wall.hit_box)
 
     def place_fountain(self, tile_x, tile_y):
         """Places fountain"""
@@ -166,7 +206,9 @@ class LevelCreator:
                             pos=Vector2(tile_x * self.game_state.tile_size, tile_y * self.game_state.tile_size),
                             color="red" if tile == "A" else "blue")
         self.game_state.map_ornaments.add(fountain)
+        fountain.collision_layer = CollisionLayer.WALL
         self.game_state.walls.add(fountain)
+        self.game_state.tile_grid.block(fountain.hit_box)
 
     def place_spike(self, tile_x, tile_y):
         """Places spike into the game"""
@@ -174,7 +216,7 @@ class LevelCreator:
                       game_state=self.game_state,
                       pos=Vector2(tile_x * self.game_state.tile_size, tile_y * self.game_state.tile_size),
                       damage=Spike.DAMAGE,
-                      damage_list=[self.game_state.enemies, self.game_state.player_group])
+                      damage_mask=CollisionLayer.ENEMY | CollisionLayer.PLAYER)
         self.game_state.map_ornaments.add(spike)
 
     def place_movable(self, tile_x, tile_y):
@@ -183,7 +225,9 @@ class LevelCreator:
                           game_state=self.game_state,
                           pos=Vector2((tile_x + 0.5) * self.game_state.tile_size,
                                       (tile_y + 0.5) * self.game_state.tile_size))
+        movable.collision_layer = CollisionLayer.MOVABLE
         self.game_state.movables.add(movable)
+        self.game_state.tile_grid.block(movable.hit_box)
 
     def place_movable_with_image(self, tile_x, tile_y, image):
         """Places movable block by player"""
@@ -192,7 +236,9 @@ class LevelCreator:
                           pos=Vector2((tile_x + 0.5) * self.game_state.tile_size,
                                       (tile_y + 0.5) * self.game_state.tile_size))
         movable.image = image
+        movable.collision_layer = CollisionLayer.MOVABLE
         self.game_state.movables.add(movable)
+        self.game_state.tile_grid.block(movable.hit_box)
 
     def place_door(self, tile_x1, tile_y1, tile_x2, tile_y2, activation_condition):
         """Places door"""
@@ -235,45 +281,50 @@ class LevelCreator:
         self.level[int(self.stage.y) * self.game_state.tile_dim[1] + tile_y][
             int(self.stage.x) * self.game_state.tile_dim[0] + tile_x] = " "
 
+    def add_enemy(self, enemy):
+        """Adds a placed enemy to the enemy layer and group."""
+        enemy.collision_layer = CollisionLayer.ENEMY
+        self.game_state.enemies.add(enemy)
+
     def place_melee(self, tile_x, tile_y):
         """Places melee enemy at tile location."""
-        self.game_state.enemies.add(Melee(group=self.game_state.all_sprites,
-                                          game_state=self.game_state,
-                                          pos=Vector2((2 * tile_x + 1) / 2 * self.game_state.tile_size,
-                                                      (2 * tile_y + 1) / 2 * self.game_state.tile_size),
-                                          speed=3,
-                                          health=100,
-                                          melee_range=100))
+        self.add_enemy(Melee(group=self.game_state.all_sprites,
+                             game_state=self.game_state,
+                             pos=Vector2((2 * tile_x + 1) / 2 * self.game_state.tile_size,
+                                         (2 * tile_y + 1) / 2 * self.game_state.tile_size),
+                             speed=3,
+                             health=100,
+                             melee_range=100))
 
     def place_fire_mage(self, tile_x, tile_y):
         """Places fire mage enemy at tile location."""
-        self.game_state.enemies.add(FireMage(group=self.game_state.all_sprites,
-                                             game_state=self.game_state,
-                                             pos=Vector2((2 * tile_x + 1) / 2 * self.game_state.tile_size,
-                                                         (2 * tile_y + 1) / 2 * self.game_state.tile_size),
-                                             speed=3,
-                                             health=50,
-                                             range=200,
-                                             attack_list=[self.game_state.walls, self.game_state.player_group]))
+        self.add_enemy(FireMage(group=self.game_state.all_sprites,
+                                game_state=self.game_state,
+                                pos=Vector2((2 * tile_x + 1) / 2 * self.game_state.tile_size,
+                                            (2 * tile_y + 1) / 2 * self.game_state.tile_size),
+                                speed=3,
+                                health=50,
+                                range=200,
+                                attack_mask=CollisionLayer.WALL | CollisionLayer.PLAYER))
 
     def place_root_mage(self, tile_x, tile_y):
         """Places fire mage enemy at tile location."""
-        self.game_state.enemies.add(RootMage(group=self.game_state.all_sprites,
-                                             game_state=self.game_state,
-                                             pos=Vector2((2 * tile_x + 1) / 2 * self.game_state.tile_size,
-                                                         (2 * tile_y + 1) / 2 * self.game_state.tile_size),
-                                             speed=1.2,
-                                             health=50,
-                                             range=400,
-                                             attack_list=[self.game_state.walls, self.game_state.player_group]))
+        self.add_enemy(RootMage(group=self.game_state.all_sprites,
+                                game_state=self.game_state,
+                                pos=Vector2((2 * tile_x + 1) / 2 * self.game_state.tile_size,
+                                            (2 * tile_y + 1) / 2 * self.game_state.tile_size),
+                                speed=1.2,
+                                health=50,
+                                range=400,
+                                attack_mask=CollisionLayer.WALL | CollisionLayer.PLAYER))
 
     def place_hook_mage(self, tile_x, tile_y):
         """Places fire mage enemy at tile location."""
-        self.game_state.enemies.add(HookMage(group=self.game_state.all_sprites,
-                                             game_state=self.game_state,
-                                             pos=Vector2((2 * tile_x + 1) / 2 * self.game_state.tile_size,
-                                                         (2 * tile_y + 1) / 2 * self.game_state.tile_size),
-                                             speed=3,
-                                             health=50,
-                                             range=400,
-                                             attack_list=[self.game_state.walls, self.game_state.player_group]))
+        self.add_enemy(HookMage(group=self.game_state.all_sprites,
+                                game_state=self.game_state,
+                                pos=Vector2((2 * tile_x + 1) / 2 * self.game_state.tile_size,
+                                            (2 * tile_y + 1) / 2 * self.game_state.tile_size),
+                                speed=3,
+                                health=50,
+                                range=400,
+                                attack_mask=CollisionLayer.WALL | CollisionLayer.PLAYER))
@@ -1,4 +1,6 @@
-from game_state import *
+import startup_profile
+with startup_profile.timed_imports():
+    from game_state import *
 
 
 class Game:
@@ -7,7 +9,12 @@ class Game:
         # tuple for window size
         self.window_size = window_size
         # pygame surface for display window
-        self.screen = pg.display.set_mode(self.window_size)
+        self.screen = asset_manager.set_display_mode(self.window_size)
+        # prebuilt asset pack, images are decoded from disk if it has not been built
+        asset_manager.open_pack()
+        # decodes images in the background, the start menu only waits for its own
+        for group in ["start_menu", "playing", "menus"]:
+            asset_manager.preload(group)
         self.fps = fps
         # pygame clock for fixed FPS
         self.clock = pg.time.Clock()
@@ -15,12 +22,14 @@ class Game:
         # game state: game is running
         self.running = False
 
-        # game states manager to switch between states
-        self.game_state_manager = GameStateManager(self, StartMenu(self, "start_menu"), {
-            "playing": PlayingState(self, "playing"),
-            "pause_menu": PauseMenu(self, "pause_menu"),
-            "quit_to_menu": GameOverMenu(self, "game_over"),
-            "game_win": GameWinMenu(self, "game_win")
+        # game states manager to switch between states, pooled states are built when they are first entered
+        with startup_profile.timed("state", "start_menu"):
+            start_menu = StartMenu(self, "start_menu")
+        self.game_state_manager = GameStateManager(self, start_menu, {
+            "playing": lambda: PlayingState(self, "playing"),
+            "pause_menu": lambda: PauseMenu(self, "pause_menu"),
+            "quit_to_menu": lambda: GameOverMenu(self, "game_over"),
+            "game_win": lambda: GameWinMenu(self, "game_win")
         })
 
     def start(self):
@@ -28,7 +37,11 @@ class Game:
         self.running = True
         pg.init()
         pg.font.init()
-        self.game_state_manager.state_stack[-1].load()
+        with startup_profile.timed("state", "start_menu.load"):
+            self.game_state_manager.state_stack[-1].load()
+        # startup ends once the first frame of the start menu is drawn
+        self.game_state_manager.state_stack[-1].loop()
+        startup_profile.write()
         self.loop()
 
     def loop(self):
@@ -42,7 +55,8 @@ class Game:
         self.running = False
 
     def exit(self):
-        pass
+        # adds states and assets that were loaded lazily after startup to the profile
+        startup_profile.write()
 
 
 # start game
@@ -0,0 +1,150 @@
+import math
+
+
+class PassabilityGrid:
+    """
+    Whole-tile passability of the current stage, used for pathfinding.
+
+    A tile is blocked if it is a spike tile of the level or if any of its cells in the tile grid is blocked, so walls,
+    fountains, closed doors and movable blocks are all pathed around. The grid is rebuilt from the tile grid only when
+    the tile grid or its revision changed since the last build.
+
+    Line of sight is checked on a separate sight mask of the tiles that stop projectiles, those under walls, fountains
+    and closed doors, since projectiles fly over spikes and through movable blocks. Clear paths for walking are checked
+    on a clearance mask of the tiles next to a blocked tile, since an enemy is a whole tile wide and may stand anywhere
+    in its tile. Both queries walk the tiles under the line between two tile centers and are cached until the grid
+    changes.
+    """
+
+    def __init__(self, game_state):
+        self.game_state = game_state
+        self.width, self.height = game_state.tile_dim
+        # 1 for every blocked tile row by row, 0 for every passable one
+        self.cells = bytearray(self.width * self.height)
+        # 1 for every tile that stops projectiles row by row, 0 for every other one
+        self.sight_cells = bytearray(self.width * self.height)
+        # 1 for every tile that is blocked or next to a blocked tile, diagonals included, row by row
+        self.clearance_cells = bytearray(self.width * self.height)
+        # (tile grid, grid revision) the grid was built for
+        self.key = None
+        # results of line of sight and clear path queries keyed by (start tile, end tile), cleared when the grid is
+        # rebuilt
+        self.sight_cache = {}
+        self.path_cache = {}
+
+    def refresh(self):
+        """Rebuilds the grid if the stage or the tile grid changed since it was built."""
+        tile_grid = self.game_state.tile_grid
+        key = (tile_grid, tile_grid.revision)
+        if key != self.key:
+            self.update()
+            self.key = key
+
+    def update(self):
+        """Rebuilds the grid from the level and the tile grid."""
+        level_creator = self.game_state.level_creator
+        stage = level_creator.stage
+        rows = level_creator.level[int(stage.y) * self.height:int(stage.y + 1) * self.height]
+        first_column = int(stage.x) * self.width
+
+        tile_grid = self.game_state.tile_grid
+        grid_cells, grid_width = tile_grid.cells, tile_grid.width
+        width = self.width
+        cells = bytearray(width * self.height)
+        for y in range(self.height):
+            # the tile grid has two cells per tile and a one tile margin
+            top = (2 * y + 2) * grid_width
+            bottom = top + grid_width
+            for x in range(width):
+                left = 2 * x + 2
+                if rows[y][first_column + x] == "S" or grid_cells[top + left] or grid_cells[top + left + 1] or \
+                        grid_cells[bottom + left] or grid_cells[bottom + left + 1]:
+                    cells[y * width + x] = 1
+        self.cells = cells
+
+        clearance_cells = bytearray(width * self.height)
+        for y in range(self.height):
+            for x in range(width):
+                if cells[y * width + x]:
+                    for u_y in range(max(y - 1, 0), min(y + 2, self.height)):
+                        for u_x in range(max(x - 1, 0), min(x + 2, width)):
+                            clearance_cells[u_y * width + u_x] = 1
+        self.clearance_cells = clearance_cells
+
+        # the walls group holds the walls, fountains and closed doors
+        tile_size = self.game_state.tile_size
+        sight_cells = bytearray(width * self.height)
+        for wall in self.game_state.walls:
+            hit_box = wall.hit_box
+            for y in range(max(hit_box.top // tile_size, 0), min((hit_box.bottom - 1) // tile_size + 1, self.height)):
+                for x in range(max(hit_box.left // tile_size, 0), min((hit_box.right - 1) // tile_size + 1, width)):
+                    sight_cells[y * width + x] = 1
+        self.sight_cells = sight_cells
+        self.sight_cache.clear()
+        self.path_cache.clear()
+
+    def line_of_sight(self, start, end):
+        """
+        Checks if the line between the centers of two tiles passes no tile that stops projectiles, not counting the
+        start and end tiles themselves.
+
+        Tiles are walked one at a time along the line with a DDA, and a line passing exactly through the corner of two
+        tiles is blocked by either of them.
+        """
+        self.refresh()
+        return self.cached_walk(self.sight_cache, self.sight_cells, start, end)
+
+    def path_clear(self, start, end):
+        """
+        Checks if the line between the centers of two tiles keeps a tile away from every blocked tile of the grid, not
+        counting the start and end tiles themselves, so that an enemy can walk it straight without pathfinding.
+        """
+        self.refresh()
+        return self.cached_walk(self.path_cache, self.clearance_cells, start, end)
+
+    def cached_walk(self, cache, cells, start, end):
+        """Returns the cached result of walking the line between two tiles over a mask, walking it if not cached."""
+        start = int(start[0]), int(start[1])
+        end = int(end[0]), int(end[1])
+        key = (start, end)
+        clear = cache.get(key)
+        if clear is None:
+            clear = self.walk_line(cells, start, end)
+            cache[key] = clear
+        return clear
+
+    def walk_line(self, cells, start, end):
+        """Walks the tiles under the line between two tile centers, returning False at the first one set in cells."""
+        x, y = start
+        end_x, end_y = end
+        if not (0 <= x < self.width and 0 <= y < self.height and 0 <= end_x < self.width and 0 <= end_y < self.height):
+            return False
+        delta_x, delta_y = end_x - x, end_y - y
+        step_x = 1 if delta_x > 0 else -1
+        step_y = 1 if delta_y > 0 else -1
+        # fraction of the line needed to cross one tile along each axis, in units of 1 / (2 * |delta_x| * |delta_y|) so
+        # that corners are found exactly
+        t_delta_x = 2 * abs(delta_y) if delta_x != 0 else math.inf
+        t_delta_y = 2 * abs(delta_x) if delta_y != 0 else math.inf
+        # fraction of the line at which it crosses the next tile border along each axis, starting from a tile center
+        t_max_x = t_delta_x // 2 if delta_x != 0 else math.inf
+        t_max_y = t_delta_y // 2 if delta_y != 0 else math.inf
+        width = self.width
+        while (x, y) != (end_x, end_y):
+            if t_max_x < t_max_y:
+                x += step_x
+                t_max_x += t_delta_x
+            elif t_max_y < t_max_x:
+                y += step_y
+                t_max_y += t_delta_y
+            else:
+                # passes through a corner, touching both tiles beside it
+                if cells[y * width + x + step_x] or cells[(y + step_y) * width + x]:
+                    return False
+                x += step_x
+                y += step_y
+                t_max_x += t_delta_x
+                t_max_y += t_delta_y
+            if (x, y) != (end_x, end_y) and cells[y * width + x]:
+                return False
+        return True
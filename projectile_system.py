@@ -0,0 +1,145 @@
+import numpy as np
+import pygame as pg
+import asset_manager
+from entity.game_entity import CollisionLayer
+
+
+class ProjectileSystem:
+    """
+    Moves every projectile of a game state and finds what it hits in one vectorized step per tick.
+
+    Positions, velocities, hit box sizes and the combined kill and damage masks of all live projectiles are kept as rows
+    of parallel arrays. Every tick they are advanced together, culled when they leave the screen, and tested at once
+    against a packed array of the hit boxes in the spatial hash of the game state. Projectile sprites keep their images,
+    animation and hit behavior, and collision_behavior is only called for actual contacts.
+
+    Projectiles with pixel_perfect set are tested against the entities in PIXEL_PERFECT_LAYERS with the bounds of their
+    current image instead of their hit box, and contacts found that way are confirmed by overlapping the cached mask of
+    the image with the target hit box. Walls, doors and movable blocks are always hit with the hit box.
+    """
+    # layers of the entities that pixel perfect projectiles hit with the opaque pixels of their image
+    PIXEL_PERFECT_LAYERS = CollisionLayer.PLAYER | CollisionLayer.ENEMY
+
+    def __init__(self, game_state, capacity=64):
+        self.game_state = game_state
+        # projectile sprite of every row
+        self.projectiles = []
+        # projectiles created since the last step, added once their hit box sizes are final
+        self.new_projectiles = []
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.size = np.zeros((capacity, 2), dtype=np.int64)
+        # sizes of the current images of pixel perfect projectiles
+        self.image_size = np.zeros((capacity, 2), dtype=np.int64)
+        self.mask = np.zeros(capacity, dtype=np.int64)
+        self.pixel_perfect = np.zeros(capacity, dtype=bool)
+        # solid masks of target hit boxes, keyed by size
+        self.solid_masks = {}
+
+    def add(self, projectile):
+        """Adds a projectile, which starts moving on the next step."""
+        self.new_projectiles.append(projectile)
+
+    def translate(self, offset):
+        """Moves every projectile by an offset, such as the camera movement in the start menu."""
+        self.pos[:len(self.projectiles)] += (offset.x, offset.y)
+
+    def update(self):
+        """Advances all projectiles by one tick, then kills those off screen and applies every hit."""
+        self.compact()
+        count = len(self.projectiles)
+        if count == 0:
+            return
+        pos = self.pos[:count]
+        pos += self.vel[:count]
+        for projectile, (x, y) in zip(self.projectiles, pos.tolist()):
+            projectile.pos.update(x, y)
+
+        # pygame places rects by rounding the center to whole pixels
+        center = np.trunc(pos + np.copysign(0.5, pos)).astype(np.int64)
+        targets, target_rects, target_layers = self.pack_targets()
+        if len(targets) > 0:
+            layer_hits = self.mask[:count, None] & target_layers[None, :] != 0
+            hits = self.box_hits(center - self.size[:count] // 2, self.size[:count], target_rects) & layer_hits
+            # contacts that are only hits if the image mask overlaps the target
+            image_tested = np.zeros_like(hits)
+            pixel_perfect = self.pixel_perfect[:count]
+            if pixel_perfect.any():
+                # entities are tested with the bounds of the current, possibly rotated, image instead of the hit box
+                for row in np.flatnonzero(pixel_perfect):
+                    self.image_size[row] = self.projectiles[row].image.get_size()
+                image_left_top = center - self.image_size[:count] // 2
+                image_hits = self.box_hits(image_left_top, self.image_size[:count], target_rects) & layer_hits
+                image_tested = pixel_perfect[:, None] & (target_layers[None, :] & self.PIXEL_PERFECT_LAYERS != 0)
+                hits = np.where(image_tested, image_hits, hits)
+            for row, column in zip(*np.nonzero(hits)):
+                if image_tested[row, column] and \
+                        not self.mask_hit(self.projectiles[row], image_left_top[row], targets[column]):
+                    continue
+                self.projectiles[row].collision_behavior(targets[column])
+
+        # out of screen bounds then deleted
+        window_size = self.game_state.game.window_size
+        outside = ~((0 < pos[:, 0]) & (pos[:, 0] < window_size[0]) & (0 < pos[:, 1]) & (pos[:, 1] < window_size[1]))
+        for row in np.flatnonzero(outside):
+            self.projectiles[row].kill()
+
+    @staticmethod
+    def box_hits(left_top, size, target_rects):
+        """Returns which boxes, as rows of left_top and size, overlap which target rects of (left, top, right, bottom)."""
+        right_bottom = left_top + size
+        return ((left_top[:, 0, None] < target_rects[None, :, 2]) &
+                (target_rects[None, :, 0] < right_bottom[:, 0, None]) &
+                (left_top[:, 1, None] < target_rects[None, :, 3]) &
+                (target_rects[None, :, 1] < right_bottom[:, 1, None]))
+
+    def mask_hit(self, projectile, image_pos, target):
+        """Checks if the opaque pixels of a projectile image placed at image_pos overlap the hit box of a target."""
+        hit_box = target.hit_box
+        solid_mask = self.solid_masks.get(hit_box.size)
+        if solid_mask is None:
+            solid_mask = pg.Mask(hit_box.size, fill=True)
+            self.solid_masks[hit_box.size] = solid_mask
+        offset = (hit_box.left - int(image_pos[0]), hit_box.top - int(image_pos[1]))
+        return asset_manager.get_mask(projectile.image).overlap(solid_mask, offset) is not None
+
+    def compact(self):
+        """Drops the rows of killed projectiles and adds the rows of new ones."""
+        alive = [row for row, projectile in enumerate(self.projectiles) if projectile.alive()]
+        if len(alive) != len(self.projectiles):
+            count = len(alive)
+            for array in (self.pos, self.vel, self.size, self.image_size, self.mask, self.pixel_perfect):
+                array[:count] = array[alive]
+            self.projectiles = [self.projectiles[row] for row in alive]
+
+        new_projectiles = [projectile for projectile in self.new_projectiles if projectile.alive()]
+        self.new_projectiles = []
+        count = len(self.projectiles)
+        if count + len(new_projectiles) > len(self.mask):
+            self.grow(count + len(new_projectiles))
+        for row, projectile in enumerate(new_projectiles, count):
+            self.pos[row] = projectile.pos.x, projectile.pos.y
+            self.vel[row] = projectile.vel.x, projectile.vel.y
+            self.size[row] = projectile.hit_box.size
+            self.mask[row] = projectile.kill_mask | projectile.damage_mask
+            self.pixel_perfect[row] = projectile.pixel_perfect
+        self.projectiles += new_projectiles
+
+    def grow(self, capacity):
+        """Doubles the capacity of the arrays until they fit a number of projectiles."""
+        new_capacity = len(self.mask)
+        while new_capacity < capacity:
+            new_capacity *= 2
+        for name in ("pos", "vel", "size", "image_size", "mask", "pixel_perfect"):
+            array = getattr(self, name)
+            grown = np.zeros((new_capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def pack_targets(self):
+        """Returns the living sprites of the spatial hash with arrays of their hit box edges and collision layers."""
+        targets = list(dict.fromkeys(sprite for group in self.game_state.spatial_hash.groups for sprite in group))
+        rects = np.array([(sprite.hit_box.left, sprite.hit_box.top, sprite.hit_box.right, sprite.hit_box.bottom)
+                          for sprite in targets], dtype=np.int64).reshape(-1, 4)
+        layers = np.array([sprite.collision_layer for sprite in targets], dtype=np.int64)
+        return targets, rects, layers
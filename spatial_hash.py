@@ -0,0 +1,102 @@
+import math
+import pygame as pg
+
+
+class SpatialHash:
+    """
+    Uniform grid of the sprites that damage sources collide with, so that collision checks only test nearby sprites.
+
+    The hash is rebuilt from its groups at the start of every tick. Sprites are bucketed by their hit boxes grown by a
+    margin, which covers how far they can move during the tick after the rebuild, and queries test the current hit box or
+    position of every candidate.
+    """
+
+    def __init__(self, groups, cell_size, margin):
+        # sprite groups stored in the hash
+        self.groups = groups
+        self.cell_size = cell_size
+        self.margin = margin
+        # lists of sprites keyed by (column, row) of the cell
+        self.buckets = {}
+
+    def rebuild(self):
+        """Buckets every sprite of the groups by its current hit box."""
+        self.buckets.clear()
+        for group in self.groups:
+            for sprite in group:
+                for key in self.cell_keys(sprite.hit_box.inflate(2 * self.margin, 2 * self.margin)):
+                    bucket = self.buckets.get(key)
+                    if bucket is None:
+                        self.buckets[key] = [sprite]
+                    else:
+                        bucket.append(sprite)
+
+    def cell_keys(self, rect):
+        """Returns the keys of every cell that a rectangle overlaps."""
+        cs = self.cell_size
+        return [(x, y) for x in range(rect.left // cs, (rect.right - 1) // cs + 1)
+                for y in range(rect.top // cs, (rect.bottom - 1) // cs + 1)]
+
+    def candidates(self, rect):
+        """Returns the living sprites bucketed in the cells under a rectangle, without duplicates."""
+        found = {}
+        for key in self.cell_keys(rect):
+            for sprite in self.buckets.get(key, ()):
+                found[sprite] = None
+        return [sprite for sprite in found if sprite.alive()]
+
+    def query_rect(self, rect):
+        """Returns the sprites whose hit boxes overlap a rectangle."""
+        return [sprite for sprite in self.candidates(rect) if sprite.hit_box.colliderect(rect)]
+
+    def query_radius(self, pos, radius):
+        """Returns the sprites whose positions are strictly within a radius of pos."""
+        radius_squared = radius * radius
+        bounds = (int(pos.x - radius) - 1, int(pos.y - radius) - 1, int(2 * radius) + 3, int(2 * radius) + 3)
+        return [sprite for sprite in self.candidates(pg.Rect(bounds))
+                if (sprite.pos - pos).magnitude_squared() < radius_squared]
+
+    def query_sector(self, pos, radius, angle_min, angle_max):
+        """
+        Returns the sprites whose positions are within a radius of pos and strictly between two angles.
+
+        Angles are in radians clockwise from the positive x-axis, in the range given by sector_angle.
+        """
+        return [sprite for sprite in self.query_radius(pos, radius)
+                if angle_min < sector_angle(sprite.pos - pos) < angle_max]
+
+    def nearest(self, pos, radius, mask):
+        """
+        Returns the sprite whose position is closest to pos within a radius and whose collision layer is in mask, or
+        None if there is no such sprite.
+
+        Rings of cells are searched outwards from the cell of pos, stopping once no unsearched cell can hold a closer
+        sprite, so the cost depends on how close the nearest sprite is rather than on how many sprites there are.
+        """
+        cs = self.cell_size
+        center_x, center_y = int(pos.x // cs), int(pos.y // cs)
+        nearest_sprite = None
+        nearest_dist_squared = radius * radius
+        for ring in range(int(radius // cs) + 2):
+            for x in range(center_x - ring, center_x + ring + 1):
+                # only the border of the ring, inner cells were searched by earlier rings
+                step = 1 if x in (center_x - ring, center_x + ring) else 2 * ring
+                for y in range(center_y - ring, center_y + ring + 1, step):
+                    for sprite in self.buckets.get((x, y), ()):
+                        if not sprite.collision_layer & mask or not sprite.alive():
+                            continue
+                        dist_squared = (sprite.pos - pos).magnitude_squared()
+                        if dist_squared < nearest_dist_squared:
+                            nearest_dist_squared = dist_squared
+                            nearest_sprite = sprite
+            # sprites in further rings are at least ring cells away
+            if ring * cs * ring * cs >= nearest_dist_squared:
+                break
+        return nearest_sprite
+
+
+def sector_angle(v):
+    """Angle of a vector relative to the horizontal, between -pi/2 and 3pi/2."""
+    if v.x == 0:
+        return math.pi / 2 if v.y > 0 else -math.pi / 2
+    return math.atan(v.y / v.x) if v.x > 0 else math.atan(v.y / v.x) + math.pi
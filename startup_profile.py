@@ -0,0 +1,87 @@
+"""
+Opt-in breakdown of where startup time goes.
+
+Set the PUZLAS_STARTUP_PROFILE environment variable to a file path to enable it. Module imports, asset loads, game
+state construction and level creation are timed, and the timings are written to that path as JSON once the first
+frame has been drawn, and again when the game exits.
+"""
+import builtins
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+# path the profile is written to, None if profiling is off
+PROFILE_PATH = os.environ.get("PUZLAS_STARTUP_PROFILE")
+
+# time the profiler was imported, which main.py does before anything else
+_start_time = time.perf_counter()
+# timed sections as dicts of category, name, start and duration in seconds
+_records = []
+
+
+@contextmanager
+def timed(category, name):
+    """Records the wall time of the block under a category, such as "asset" or "state", and a name."""
+    if PROFILE_PATH is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _records.append({
+            "category": category,
+            "name": name,
+            "start": start - _start_time,
+            "duration": time.perf_counter() - start
+        })
+
+
+def profiled(category):
+    """Decorator that records every call of a function under a category, leaving the function as is if profiling is off."""
+    def decorator(function):
+        if PROFILE_PATH is None:
+            return function
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with timed(category, function.__qualname__):
+                return function(*args, **kwargs)
+        return timed_function
+    return decorator
+
+
+@contextmanager
+def timed_imports():
+    """Records every module imported for the first time inside the block, including the modules it imports."""
+    if PROFILE_PATH is None:
+        yield
+        return
+    original_import = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level != 0 or name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+        with timed("import", name):
+            return original_import(name, globals, locals, fromlist, level)
+
+    builtins.__import__ = timed_import
+    try:
+        yield
+    finally:
+        builtins.__import__ = original_import
+
+
+def write():
+    """Writes all timings recorded so far to the profile file."""
+    if PROFILE_PATH is None:
+        return
+    with open(PROFILE_PATH, "w") as profile_file:
+        json.dump({
+            "total": time.perf_counter() - _start_time,
+            "records": list(_records)
+        }, profile_file, indent=2)
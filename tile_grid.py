@@ -0,0 +1,99 @@
+import math
+from pygame.math import *
+
+
+class TileGrid:
+    """
+    Passability grid of the current stage, used for collision with walls.
+
+    Cells are half a tile wide, since walls, fountains and doors are all aligned to half tiles. Every cell counts the
+    blockers covering it, so overlapping blockers can be added and removed independently. The grid extends one tile
+    past the screen on every side for doors that stick out of the stage.
+    """
+
+    def __init__(self, tile_dim, tile_size):
+        self.cell_size = tile_size // 2
+        self.width = (tile_dim[0] + 2) * 2
+        self.height = (tile_dim[1] + 2) * 2
+        # number of blockers covering each cell, row by row
+        self.cells = bytearray(self.width * self.height)
+        # screen position of the top left corner of the grid, moved with the camera in the start menu
+        self.offset = Vector2(-tile_size, -tile_size)
+        # incremented whenever a blocker is added or removed, so that path data can tell when the map has changed
+        self.revision = 0
+
+    def cell_range(self, rect):
+        """Returns the range of cell columns and rows that a rectangle overlaps, clipped to the grid."""
+        left = max(int((rect.left - self.offset.x) // self.cell_size), 0)
+        right = min(int((rect.right - 1 - self.offset.x) // self.cell_size), self.width - 1)
+        top = max(int((rect.top - self.offset.y) // self.cell_size), 0)
+        bottom = min(int((rect.bottom - 1 - self.offset.y) // self.cell_size), self.height - 1)
+        return range(left, right + 1), range(top, bottom + 1)
+
+    def block(self, rect):
+        """Marks the cells under a rectangle as blocked."""
+        columns, rows = self.cell_range(rect)
+        for y in rows:
+            for x in columns:
+                self.cells[y * self.width + x] += 1
+        self.revision += 1
+
+    def unblock(self, rect):
+        """Removes a blocker previously added with the same rectangle."""
+        columns, rows = self.cell_range(rect)
+        for y in rows:
+            for x in columns:
+                self.cells[y * self.width + x] -= 1
+        self.revision += 1
+
+    def collides(self, rect):
+        """Checks if a rectangle overlaps any blocked cell, only looking at the cells under it."""
+        columns, rows = self.cell_range(rect)
+        cells = self.cells
+        for y in rows:
+            row = y * self.width
+            for x in columns:
+                if cells[row + x]:
+                    return True
+        return False
+
+    def sweep(self, rect, distance, axis):
+        """
+        Returns how far a rectangle can move by distance along an axis (0 for x, 1 for y) before touching a blocked cell.
+
+        The whole path is checked at once, a line of cells at a time, so a fast entity costs the same as a slow one. A
+        blocked move ends exactly against the blocker, and being an integer it keeps positions that pygame rounds to whole
+        pixels flush with it.
+        """
+        if distance == 0:
+            return 0
+        columns, rows = self.cell_range(rect)
+        if axis == 0:
+            lanes, origin, low, high, size = rows, self.offset.x, rect.left, rect.right, self.width
+        else:
+            lanes, origin, low, high, size = columns, self.offset.y, rect.top, rect.bottom, self.height
+        cs = self.cell_size
+        if distance > 0:
+            # rounds the distance up, as the rect of the moved entity may be rounded up to the next pixel
+            first = int((high - 1 - origin) // cs) + 1
+            last = int((high - 1 + math.ceil(distance) - origin) // cs)
+            lines = range(max(first, 0), min(last, size - 1) + 1)
+        else:
+            first = int((low - origin) // cs) - 1
+            last = int((low + math.floor(distance) - origin) // cs)
+            lines = range(min(first, size - 1), max(last, 0) - 1, -1)
+        for line in lines:
+            if self.line_blocked(line, lanes, axis):
+                if distance > 0:
+                    return int(line * cs + origin) - high
+                return int((line + 1) * cs + origin) - low
+        return distance
+
+    def line_blocked(self, line, lanes, axis):
+        """Checks if any cell of a column (axis 0) or row (axis 1) is blocked within a range of rows or columns."""
+        cells = self.cells
+        if axis == 0:
+            return any(cells[y * self.width + line] for y in lanes)
+        row = line * self.width
+        return any(cells[row + x] for x in lanes)
+